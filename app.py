@@ -7,16 +7,28 @@ import streamlit as st
 from oauth2client.service_account import ServiceAccountCredentials
 
 from config import (
-    SCOPE, MENU_TREE, 
-    SHEET_HANG_TON_NAME, HANG_TON_NAME_START, HANG_TON_NAME_END,
-    HANG_TON_VALUE_START, HANG_TON_VALUE_END, GIA_ROW_VALUE, 
+    SCOPE, MENU_TREE, SHEET_HANG_TON_NAME, GIA_ROW_VALUE, 
     GIA_ROW_NAME, GIA_ROW_START, GIA_ROW_END, MEO_HTML
 )
 import streamlit.components.v1 as components
-from util import get_secret, get_sheet_values, get_stock_data, get_stock, get_gia_hang
+from util import get_secret, get_gia_hang, format_age
+from sheet_store import get_snapshot_store
+from order_table import load_order_table
+from sales_aggregates import get_aggregate_store
+from stock_ledger import get_stock_ledger
+from outbox import get_order_outbox
+from refresher import get_data_refresher
+from sheets_gateway import get_sheets_gateway, GuardedSpreadsheet
+from perf import begin_rerun, end_rerun, span, configure as configure_perf, render_perf_panel
+from metrics import start_metrics_exporter, CACHE_REQUESTS, CACHE_MISSES
 
 SHARE_URL = get_secret("SHARE_URL")
 GSP_CRED = get_secret("GSP_CRED")
+# Bảng đo hiệu năng ẩn cho dev & log JSON-lines từng lượt chạy (để trống = tắt)
+PERF_PANEL = str(get_secret("PERF_PANEL")).strip().lower() in ("1", "true", "yes")
+configure_perf(get_secret("PERF_LOG_PATH"))
+# Metrics dạng Prometheus cho scraper cùng máy: endpoint http://127.0.0.1:<METRICS_PORT>/metrics và/hoặc file định kỳ
+start_metrics_exporter(get_secret("METRICS_PORT"), get_secret("METRICS_FILE_PATH"))
 
 # --- CẤU HÌNH TRANG ---
 st.set_page_config(
@@ -36,47 +48,111 @@ def get_gspread_client(credentials_b64, scope):
 
 @st.cache_resource
 def get_spreadsheet_instance(_client, url):
-    return _client.open_by_url(url)
-
-# --- KHỞI TẠO ĐỐI TƯỢNG KẾT NỐI ---
-client = get_gspread_client(GSP_CRED, SCOPE)
-spreadsheet = get_spreadsheet_instance(client, SHARE_URL)
-sheet = spreadsheet.sheet1
-worksheetton = spreadsheet.worksheet(SHEET_HANG_TON_NAME)
-
-# --- ĐỒNG BỘ DATA ĐẦU VÀO VÀO SESSION STATE ---
-if "sheet_data" not in st.session_state:
-    st.session_state.sheet_data = get_sheet_values(sheet)
-
-# Tải trước danh mục giá & kho hàng để truyền xuống các View con
-gia_mat_hang = get_gia_hang(st.session_state.sheet_data, row_value=GIA_ROW_VALUE, row_name=GIA_ROW_NAME, row_start=GIA_ROW_START, row_end=GIA_ROW_END)
-headers_ton, values_ton = get_stock_data(worksheetton, f"{HANG_TON_NAME_START}:{HANG_TON_NAME_END}", f"{HANG_TON_VALUE_START}:{HANG_TON_VALUE_END}")
-stock_data = get_stock(headers_ton=headers_ton, values_ton=values_ton)
-
-# --- THANH DIỀU HƯỚNG SIDEBAR ---
-menu = st.sidebar.radio("📋 Menu", MENU_TREE)
-
-# Banner trang trí mặc định (Ẩn tại tab giới thiệu)
-if menu != "👉 Về chúng tôi":
-    components.html(MEO_HTML, height=80)
-
-# --- BỘ ĐIỀU HƯỚNG ROUTER CHUYỂN TRANG DYNAMIC ---
-if menu == "📊 Con số biết nói":
-    from views.dashboard import show_dashboard
-    show_dashboard(gia_mat_hang)
-
-elif menu == "📥 Nhập đơn hàng":
-    from views.order_entry import show_order_entry
-    show_order_entry(sheet, stock_data)
-
-elif menu == "📄 Tra cứu đơn hàng":
-    from views.order_lookup import show_order_lookup
-    show_order_lookup(gia_mat_hang)
-
-elif menu == "🖨️ In đơn hàng":
-    from views.order_print import show_order_print
-    show_order_print(gia_mat_hang)
-
-elif menu == "👉 Về chúng tôi":
-    from views.about_us import show_about_us
-    show_about_us()
\ No newline at end of file
+    # Mọi lệnh gọi Sheets API từ đây trở đi đều qua bộ giới hạn tốc độ & gộp request dùng chung
+    gateway = get_sheets_gateway()
+    with span("sheets.open_by_url"):
+        return GuardedSpreadsheet(gateway.call(_client.open_by_url, url), gateway)
+
+@st.cache_resource
+def get_worksheet_instance(_spreadsheet, url, title=None):
+    # Lưu đệm handle worksheet: tránh 1 lượt tải metadata bảng tính ở mỗi lần rerun
+    with span("sheets.worksheet"):
+        return _spreadsheet.worksheet(title) if title else _spreadsheet.sheet1
+
+@st.cache_data(show_spinner=False)
+def load_price_catalog(snapshot_version, _sheet_data):
+    CACHE_MISSES.inc(cache="price_catalog")
+    with span("price_catalog"):
+        return get_gia_hang(_sheet_data, row_value=GIA_ROW_VALUE, row_name=GIA_ROW_NAME, row_start=GIA_ROW_START, row_end=GIA_ROW_END)
+
+perf_trace = begin_rerun()
+# try/finally: st.rerun()/st.stop() hay lỗi giữa chừng vẫn đóng lượt đo, không để trace treo sang lượt sau
+try:
+    # --- KHỞI TẠO ĐỐI TƯỢNG KẾT NỐI ---
+    client = get_gspread_client(GSP_CRED, SCOPE)
+    spreadsheet = get_spreadsheet_instance(client, SHARE_URL)
+    sheet = get_worksheet_instance(spreadsheet, SHARE_URL)
+    worksheetton = get_worksheet_instance(spreadsheet, SHARE_URL, SHEET_HANG_TON_NAME)
+
+    # Khởi động hàng đợi ghi đơn nền (đồng thời đẩy nốt các đơn còn tồn từ lần chạy trước)
+    outbox = get_order_outbox(sheet, SHARE_URL)
+    # Luồng nền làm mới snapshot đơn hàng, bảng giá & số tồn kho theo chu kỳ (nhanh hơn trong giờ mở bán):
+    # lượt rerun chỉ đọc bản mới nhất trong bộ nhớ thay vì chờ Google Sheets
+    refresher = get_data_refresher(sheet, worksheetton, SHARE_URL)
+
+    # --- ĐỒNG BỘ DATA ĐẦU VÀO TỪ SNAPSHOT DÙNG CHUNG TOÀN HỆ THỐNG ---
+    with span("snapshot"):
+        snapshot = get_snapshot_store().get(sheet)
+    sheet_data = snapshot.rows
+    with span("order_table"):
+        order_table = load_order_table(snapshot)
+
+    # Tải trước danh mục giá để truyền xuống các View con (tính 1 lần cho mỗi phiên bản snapshot)
+    CACHE_REQUESTS.inc(cache="price_catalog")
+    gia_mat_hang = load_price_catalog(snapshot.version, sheet_data)
+
+    # --- THANH DIỀU HƯỚNG SIDEBAR ---
+    menu = st.sidebar.radio("📋 Menu", MENU_TREE)
+
+    pending_orders = outbox.depth()
+    if pending_orders:
+        loi_ghi = f" (lỗi gần nhất: {outbox.last_error})" if outbox.last_error else ""
+        st.sidebar.caption(f"📤 {pending_orders} đơn đang chờ đồng bộ lên Google Sheets{loi_ghi}")
+    failed_orders = outbox.dead_letter_count()
+    if failed_orders:
+        st.sidebar.caption(f"⛔ {failed_orders} đơn bị Google Sheets từ chối, cần nhập tay (bảng dead_letter_orders của outbox)")
+    st.sidebar.caption(f"🕒 Dữ liệu đơn hàng cập nhật {format_age(snapshot.age)}")
+
+    # Banner trang trí mặc định (Ẩn tại tab giới thiệu)
+    # Các view dựng tương tác trong st.fragment riêng nên banner chỉ chạy lại khi đổi trang, không chạy lại theo từng widget
+    if menu != "👉 Về chúng tôi":
+        components.html(MEO_HTML, height=80)
+
+    # --- BỘ ĐIỀU HƯỚNG ROUTER CHUYỂN TRANG DYNAMIC ---
+    if menu == "📊 Con số biết nói":
+        from views.dashboard import show_dashboard
+        with span("dashboard.aggregates"):
+            aggregates = get_aggregate_store().get(order_table, get_snapshot_store())
+        with span("view.dashboard"):
+            show_dashboard(aggregates, gia_mat_hang)
+
+    elif menu in ("📥 Nhập đơn hàng", "📤 Nhập đơn hàng loạt"):
+        # Số tồn kho do luồng nền nạp vào sổ tồn kho (đã trừ sẵn đơn đã nhận & giữ chỗ);
+        # chỉ đọc ngay trên lượt rerun khi chưa có số nào (lần chạy đầu, chưa có bản lưu trên đĩa)
+        stock_ledger = get_stock_ledger()
+        if stock_ledger.age is None:
+            with span("stock"):
+                refresher.refresh_stock()
+        if menu == "📥 Nhập đơn hàng":
+            from views.order_entry import show_order_entry
+            with span("view.order_entry"):
+                show_order_entry(sheet, stock_ledger)
+        else:
+            from views.order_import import show_order_import
+            with span("view.order_import"):
+                show_order_import(sheet, stock_ledger, gia_mat_hang)
+
+    elif menu == "📄 Tra cứu đơn hàng":
+        from views.order_lookup import show_order_lookup
+        with span("view.order_lookup"):
+            show_order_lookup(order_table, gia_mat_hang)
+
+    elif menu == "🖨️ In đơn hàng":
+        from views.order_print import show_order_print
+        with span("view.order_print"):
+            show_order_print(sheet, order_table, gia_mat_hang)
+
+    elif menu == "💰 Đối soát chuyển khoản":
+        from views.reconcile import show_reconcile
+        with span("view.reconcile"):
+            show_reconcile(sheet, order_table)
+
+    elif menu == "👉 Về chúng tôi":
+        from views.about_us import show_about_us
+        with span("view.about_us"):
+            show_about_us()
+finally:
+    end_rerun(perf_trace)
+
+if PERF_PANEL:
+    render_perf_panel()
@@ -0,0 +1,98 @@
+# benchmarks/bench_text_normalize.py
+"""So sánh convert_name/normalize_key bản cũ (14 lượt re.sub) với bản bảng dịch + lru_cache trong util.py.
+
+Các tải đo: dựng chỉ mục tìm kiếm (bỏ dấu tên TNV/khách/SĐT), đối soát sao kê (mỗi nội dung chuyển khoản
+là 1 chuỗi khác nhau) và ~25 lần check_stock -> normalize_key mỗi lượt rerun trang nhập đơn.
+
+Chạy từ thư mục gốc repo:
+    python benchmarks/bench_text_normalize.py --orders 100000 --memos 5000 --reruns 1000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+warnings.filterwarnings("ignore")
+
+from config import SEARCH_COLUMN_INDEXES, GIA_ROW_NAME
+from util import convert_name, normalize_key, _convert_name, _normalize_key
+from fake_sheets import FakeSpreadsheet, PRODUCTS
+
+
+def legacy_convert_name(vietnamese_str: str) -> str:
+    """Bản cũ của util.convert_name (giữ nguyên để so kết quả & tốc độ)."""
+    if not vietnamese_str:
+        return "UNKNOWN"
+
+    patterns = {
+        '[àáảãạăằắẳẵặâầấẩẫậ]': 'a', '[èéẻẽẹêềếểễệ]': 'e', '[ìíỉĩị]': 'i',
+        '[òóỏõọôồốổỗộơờớởỡợ]': 'o', '[ùúủũụưừứửữự]': 'u', '[ỳýỷỹỵ]': 'y', '[đ]': 'd',
+        '[ÀÁẢÃẠĂẰẮẲẴẶÂẦẤẨẪẬ]': 'A', '[ÈÉẺẼẸÊỀẾỂễỆ]': 'E', '[ÌÍỈĨỊ]': 'I',
+        '[ÒÓỎÕỌÔỒỐỔỖỘƠỜỚỞỠỢ]': 'O', '[ÙÚỦŨỤƯỪỨỬỮỰ]': 'U', '[ỲÝỶỸỴ]': 'Y', '[Đ]': 'D'
+    }
+
+    output = str(vietnamese_str)
+    for regex, replacement in patterns.items():
+        output = re.sub(regex, replacement, output)
+
+    output = re.sub(r'[^a-zA-Z0-9\s]', '', output)
+    return "".join(output.upper().strip().split())
+
+
+def legacy_normalize_key(text: str) -> str:
+    if not text:
+        return ""
+    return " ".join(str(text).upper().strip().split())
+
+
+def _time(fn, clear=None) -> float:
+    if clear is not None:
+        clear()
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bỏ dấu tiếng Việt: bản cũ vs bảng dịch + cache")
+    parser.add_argument("--orders", type=int, default=100000, help="Số đơn trên sheet giả lập (chỉ mục tìm kiếm)")
+    parser.add_argument("--memos", type=int, default=5000, help="Số giao dịch trong sao kê giả lập")
+    parser.add_argument("--reruns", type=int, default=1000, help="Số lượt rerun trang nhập đơn (check_stock)")
+    args = parser.parse_args()
+
+    grid = FakeSpreadsheet(args.orders).sheet1.grid
+    rows = grid[GIA_ROW_NAME + 1:]
+    # Chỉ mục tìm kiếm đi qua toàn bộ giá trị (đã khử trùng lặp theo cột như OrderSearchIndex)
+    search_values = [row[i] for row in rows for i in SEARCH_COLUMN_INDEXES]
+    unique_search_values = list(dict.fromkeys(search_values))
+    rnd = random.Random(7)
+    memos = [f"MBVCB.{rnd.randint(10**8, 10**9)}.BANHANGF18 DON{rnd.randint(1, args.orders)} "
+             f"{rnd.choice(rows)[1]}.CT tu {rnd.randint(10**9, 10**10)}" for _ in range(args.memos)]
+    stock_lookups = [p for _ in range(args.reruns) for p in PRODUCTS]
+
+    mismatches = [v for v in unique_search_values + memos if legacy_convert_name(v) != convert_name(v)]
+    print(f"# {args.orders:,} đơn ({len(unique_search_values):,} giá trị tìm kiếm khác nhau), "
+          f"{args.memos:,} nội dung CK, {len(stock_lookups):,} lần normalize_key; "
+          f"{len(mismatches)} kết quả khác bản cũ")
+
+    cases = [
+        ("search index (unique values)", unique_search_values, legacy_convert_name, convert_name, _convert_name),
+        ("search index (all values)", search_values, legacy_convert_name, convert_name, _convert_name),
+        ("reconcile memos", memos, legacy_convert_name, convert_name, _convert_name),
+        ("check_stock normalize_key", stock_lookups, legacy_normalize_key, normalize_key, _normalize_key),
+    ]
+    print(f"{'tải':<32}{'bản cũ':>10}{'mới (nguội)':>13}{'mới (ấm)':>11}{'x nguội':>9}{'x ấm':>8}  (ms)")
+    for name, values, legacy_fn, new_fn, cached in cases:
+        legacy_ms = _time(lambda: [legacy_fn(v) for v in values])
+        cold_ms = _time(lambda: [new_fn(v) for v in values], clear=cached.cache_clear)
+        warm_ms = _time(lambda: [new_fn(v) for v in values])
+        print(f"{name:<32}{legacy_ms:>10.1f}{cold_ms:>13.1f}{warm_ms:>11.1f}"
+              f"{legacy_ms / cold_ms:>9.1f}{legacy_ms / warm_ms:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
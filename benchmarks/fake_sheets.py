@@ -0,0 +1,214 @@
+# benchmarks/fake_sheets.py
+"""Bảng tính giả lập (chạy offline) mô phỏng các hàm gspread mà app đang dùng.
+
+Dùng cho benchmark & load test: sinh N đơn hàng tổng hợp theo đúng bố cục sheet thật
+(tiêu đề dòng 5, giá dòng 4, cột SKU O..AM), có độ trễ mạng và lỗi 429 giả lập.
+"""
+import random
+import re
+import threading
+import time
+
+import gspread
+from gspread.utils import a1_to_rowcol
+
+from config import (
+    GIA_ROW_VALUE, GIA_ROW_NAME, GIA_ROW_START, GIA_ROW_END, SHEET_HANG_TON_NAME,
+    HANG_TON_NAME_START, HANG_TON_VALUE_START, product_column_map
+)
+
+HEADERS = [
+    "STT", "TÊN TNV BÁN", "TÊN KHÁCH", "CHI TIẾT ĐƠN (VUI LÒNG ĐIỀN CHÍNH XÁC VỚI Ô CỘT SỐ LƯỢNG BÊN PHẢI)",
+    "SĐT KHÁCH", "ĐỊA CHỈ", "QUẬN/TỈNH", "THỜI GIAN NHẬN HÀNG", "TỔNG TIỀN\nCẦN TRẢ\n(1)+(2)", "PHÍ SHIP (1)",
+    "TIỀN BÁN HÀNG (2)", "Đã thanh toán", "ĐÃ SOẠN ĐƠN", "ĐÃ GIAO TNV(TNV điền hoặc người giao điền)",
+]
+SHEET_WIDTH = 45
+PRODUCTS = sorted(product_column_map, key=product_column_map.get)
+VOLUNTEER_NAMES = ["Nguyễn Văn An", "Trần Thị Bình", "Lê Hoàng Cường", "Phạm Thị Dung", "Đỗ Minh Đức", "Võ Thị Hạnh"]
+
+_A1_PART = re.compile(r"([A-Z]+)(\d*)")
+
+
+class _QuotaResponse:
+    """Response tối thiểu để dựng gspread APIError mã 429 giống Google trả về."""
+    status_code = 429
+    text = "Quota exceeded"
+
+    def json(self):
+        return {"error": {"code": 429, "message": "Quota exceeded", "status": "RESOURCE_EXHAUSTED"}}
+
+
+def _format_money(value: int) -> str:
+    return f"{value:,}".replace(",", ".")
+
+
+def _parse_a1(a1: str) -> tuple:
+    """'A120:AS' -> (120, 1, None, 45); dòng cuối None nghĩa là tới hết sheet."""
+    start, _, end = a1.partition(":")
+    end = end or start
+    m1, m2 = _A1_PART.match(start), _A1_PART.match(end)
+    row_start = int(m1.group(2) or 1)
+    row_end = int(m2.group(2)) if m2.group(2) else None
+    return row_start, a1_to_rowcol(m1.group(1) + "1")[1], row_end, a1_to_rowcol(m2.group(1) + "1")[1]
+
+
+def recompute_totals(row: list, prices: list):
+    """Thay cho công thức trên sheet: TIỀN BÁN HÀNG = Σ số lượng x giá, TỔNG = ship + tiền hàng."""
+    if not row[1]:
+        return
+    total = sum(int(row[c] or 0) * int(prices[c].replace(".", "") or 0) for c in range(GIA_ROW_START, GIA_ROW_END))
+    row[10] = _format_money(total)
+    row[8] = _format_money(total + int(row[9] or 0))
+    for c in (11, 12, 13):
+        row[c] = row[c] or "FALSE"
+
+
+class FakeWorksheet:
+    """Worksheet trong bộ nhớ. `latency` (giây) cộng vào mỗi lệnh gọi, `error_rate` là xác suất trả 429."""
+
+    def __init__(self, title: str, grid: list, latency: float = 0.0, error_rate: float = 0.0, seed: int = 1):
+        self.title = title
+        self.id = abs(hash(title)) % 10**6
+        self.grid = grid
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = 0
+        self.quota_errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _hit(self):
+        with self._lock:
+            self.calls += 1
+            fail = self.error_rate and self._random.random() < self.error_rate
+            if fail:
+                self.quota_errors += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise gspread.exceptions.APIError(_QuotaResponse())
+
+    def _read(self, a1: str) -> list:
+        row_start, col_start, row_end, col_end = _parse_a1(a1)
+        row_end = row_end or len(self.grid)
+        # Giống gspread (pad_values=False): bỏ các dòng trống ở cuối vùng đọc
+        values = [list(self.grid[r - 1][col_start - 1:col_end]) for r in range(row_start, min(row_end, len(self.grid)) + 1)]
+        while values and not any(values[-1]):
+            values.pop()
+        return values
+
+    def _write(self, a1: str, values: list):
+        row_start, col_start, _, _ = _parse_a1(a1)
+        for i, row in enumerate(values):
+            r = row_start - 1 + i
+            while len(self.grid) <= r:
+                self.grid.append([""] * SHEET_WIDTH)
+            for j, value in enumerate(row):
+                self.grid[r][col_start - 1 + j] = "" if value is None else str(value)
+            recompute_totals(self.grid[r], self.grid[GIA_ROW_VALUE])
+
+    def get_all_values(self, **kwargs) -> list:
+        self._hit()
+        return [list(r) for r in self.grid]
+
+    def get(self, range_name: str, **kwargs) -> list:
+        self._hit()
+        return self._read(range_name)
+
+    def batch_get(self, ranges: list, **kwargs) -> list:
+        self._hit()
+        return [self._read(a1) for a1 in ranges]
+
+    def col_values(self, col: int, **kwargs) -> list:
+        self._hit()
+        values = [r[col - 1] if len(r) >= col else "" for r in self.grid]
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    def batch_update(self, data: list, **kwargs):
+        self._hit()
+        with self._lock:
+            for item in data:
+                self._write(item["range"], item["values"])
+
+    def update(self, values=None, range_name=None, **kwargs):
+        self._hit()
+        with self._lock:
+            self._write(range_name, values)
+
+
+class FakeSpreadsheet:
+    """Bảng tính giả gồm sheet đơn hàng (sheet1) và sheet "Quản lí tồn"."""
+
+    def __init__(self, n_orders: int = 1000, latency: float = 0.0, error_rate: float = 0.0, seed: int = 1):
+        self.sheet1 = FakeWorksheet("Sheet1", build_order_grid(n_orders, seed), latency, error_rate, seed)
+        self.stock = FakeWorksheet(SHEET_HANG_TON_NAME, build_stock_grid(seed), latency, error_rate, seed + 1)
+
+    @property
+    def calls(self) -> int:
+        return self.sheet1.calls + self.stock.calls
+
+    def get_worksheet(self, index: int):
+        return self.sheet1 if index == 0 else None
+
+    def worksheet(self, title: str):
+        if title == SHEET_HANG_TON_NAME:
+            return self.stock
+        if title == self.sheet1.title:
+            return self.sheet1
+        raise gspread.exceptions.WorksheetNotFound(title)
+
+
+class FakeClient:
+    """Thay cho gspread.Client: open_by_url luôn trả về cùng 1 bảng tính giả."""
+
+    def __init__(self, spreadsheet: FakeSpreadsheet):
+        self.spreadsheet = spreadsheet
+
+    def open_by_url(self, url: str) -> FakeSpreadsheet:
+        return self.spreadsheet
+
+
+def build_order_grid(n_orders: int, seed: int = 1) -> list:
+    rnd = random.Random(seed)
+    grid = [[""] * SHEET_WIDTH for _ in range(GIA_ROW_NAME + 1)]
+    grid[0][0] = "BÁN HÀNG F18"
+    grid[GIA_ROW_NAME][:len(HEADERS)] = HEADERS
+    product_cols = [product_column_map[p] - 1 for p in PRODUCTS]
+    for col, product in zip(product_cols, PRODUCTS):
+        # Sheet thật có vài tiêu đề bị xuống dòng giữa tên
+        grid[GIA_ROW_NAME][col] = product.replace(" 500G", "\n500G") if rnd.random() < 0.2 else product
+        grid[GIA_ROW_VALUE][col] = _format_money(rnd.randint(3, 30) * 5000)
+
+    for stt in range(1, n_orders + 1):
+        row = [""] * SHEET_WIDTH
+        row[0] = str(stt)
+        row[1] = rnd.choice(VOLUNTEER_NAMES)
+        row[2] = rnd.choice(VOLUNTEER_NAMES) + " khách"
+        row[3] = "đơn thử nghiệm"
+        row[4] = f"09{rnd.randint(10**7, 10**8 - 1)}"
+        row[9] = rnd.choice(["", "30000"])
+        for col in rnd.sample(product_cols, 3):
+            row[col] = str(rnd.randint(1, 4))
+        recompute_totals(row, grid[GIA_ROW_VALUE])
+        row[11] = rnd.choice(["TRUE", "FALSE"])
+        row[12] = rnd.choice(["TRUE", "FALSE"])
+        grid.append(row)
+    return grid
+
+
+def build_stock_grid(seed: int = 1) -> list:
+    """Sheet tồn kho: tên ở cột B, số tồn ở cột Q, bắt đầu từ dòng 3 như sheet thật."""
+    rnd = random.Random(seed)
+    names = list(dict.fromkeys("NẾP CHÁY CHÀ BÔNG 150G" if "NẾP CHÁY" in p else p for p in PRODUCTS))
+    first_row = a1_to_rowcol(HANG_TON_NAME_START)[0]
+    name_col = a1_to_rowcol(HANG_TON_NAME_START)[1]
+    value_col = a1_to_rowcol(HANG_TON_VALUE_START)[1]
+    grid = [[""] * value_col for _ in range(first_row - 1)]
+    for name in names:
+        row = [""] * value_col
+        row[name_col - 1] = name
+        row[value_col - 1] = str(rnd.randint(50, 5000))
+        grid.append(row)
+    return grid
@@ -0,0 +1,235 @@
+# benchmarks/load_test.py
+"""Giả lập N TNV dùng app cùng lúc (Streamlit AppTest, không cần trình duyệt) trên bảng tính giả lập.
+
+Mỗi phiên chạy đúng app.py: mở app -> nhập đơn & gửi -> tra cứu -> in đơn -> xem dashboard.
+Báo cáo độ trễ từng lượt rerun (p50/p90/p99), số lệnh gọi Sheets API mỗi phiên và bộ nhớ mỗi phiên.
+
+Chạy từ thư mục gốc repo:
+    python benchmarks/load_test.py --sessions 20 --orders 5000 --latency 0.3
+"""
+import argparse
+import base64
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from unittest.mock import MagicMock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import gspread
+import streamlit as st
+from oauth2client.service_account import ServiceAccountCredentials
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.secrets import Secrets
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1 import app_test as app_test_module
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+import outbox as outbox_module
+import snapshot_cache as snapshot_cache_module
+from fake_sheets import FakeSpreadsheet, FakeClient, VOLUNTEER_NAMES
+from order_writer import get_order_allocator, build_row_updates
+from outbox import get_order_outbox
+from sheet_store import get_snapshot_store
+from stock_ledger import get_stock_ledger
+from config import MIT_500G, product_column_map
+
+FAKE_URL = "https://docs.google.com/spreadsheets/d/load-test/edit"
+SECRETS = {"GSP_CRED": base64.b64encode(b"{}").decode(), "SHARE_URL": FAKE_URL}
+RERUN_TIMEOUT = 120
+
+
+class SessionRecorder:
+    """Gom thời gian từng bước (ms) của mọi phiên, dùng chung giữa các luồng."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = []
+
+    def timed(self, step: str, fn):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.samples[step].append(elapsed)
+        return result
+
+    def fail(self, session_no: int, step: str, error):
+        with self._lock:
+            self.errors.append(f"phiên {session_no} @ {step}: {error}")
+
+
+def _check(at: AppTest):
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return at
+
+
+def _by_label(elements, label: str):
+    """Tìm widget theo nhãn thay vì vị trí: thứ tự phần tử thay đổi khi trang có thêm cảnh báo/hộp thông báo."""
+    for element in elements:
+        if element.label == label:
+            return element
+    raise LookupError(f"không thấy '{label}' trên trang")
+
+
+def _send_order(session_no: int, volunteer: str) -> int:
+    """Bước bấm "📩 Gửi đơn" trong hộp thoại xác nhận.
+
+    AppTest chưa bấm được nút trong st.dialog nên đi thẳng đường ghi của view:
+    cấp STT -> đưa vào outbox -> trừ sổ tồn kho (outbox đã được app.py khởi tạo với worksheet qua gateway).
+    """
+    order_outbox = get_order_outbox(None, FAKE_URL)
+    sheet = order_outbox.sheet
+    row = [""] * 45
+    row[1], row[2], row[3] = volunteer, f"Khách tải thử {session_no}", "1 mít"
+    row[product_column_map[MIT_500G] - 1] = 1
+    stt, row_index = get_order_allocator().allocate(get_snapshot_store().get(sheet, wait_for_sheet=True))
+    row[0] = stt
+    order_outbox.enqueue(stt, row_index, build_row_updates(row_index, row))
+    get_stock_ledger().commit(f"load-test-{session_no}", stt, {MIT_500G: 1})
+    return stt
+
+
+def _open_page(at: AppTest, menu: str):
+    return _check(_by_label(at.sidebar.radio, "📋 Menu").set_value(menu).run())
+
+
+def run_session(session_no: int, at: AppTest, recorder: SessionRecorder):
+    step = "mở app"
+    try:
+        recorder.timed(step, lambda: _check(at.run()))
+
+        step = "nhập đơn: xác nhận form"
+        volunteer = VOLUNTEER_NAMES[session_no % len(VOLUNTEER_NAMES)]
+        _by_label(at.text_input, "👤 Tên TNV bán *").input(volunteer)
+        _by_label(at.text_input, "👥 Tên khách *").input(f"Khách tải thử {session_no}")
+        _by_label(at.text_area, "📋 Chi tiết đơn hàng*").input("1 mít")
+        _by_label(at.number_input, "🥭 Mít sấy 500g").set_value(1)
+        recorder.timed(step, lambda: _check(_by_label(at.button, "🚀 Xác nhận & Gửi đơn").click().run()))
+
+        step = "nhập đơn: gửi (ghi outbox)"
+        stt = recorder.timed(step, lambda: _send_order(session_no, volunteer))
+
+        step = "tra cứu"
+        recorder.timed(step, lambda: _open_page(at, "📄 Tra cứu đơn hàng"))
+        step = "tra cứu: xem đơn theo STT"
+        _by_label(at.number_input, "🔢 Điền STT đơn hàng cần tra cứu:").set_value(max(1, stt - 1))
+        recorder.timed(step, lambda: _check(_by_label(at.button, "Tra cứu").click().run()))
+
+        step = "in đơn"
+        recorder.timed(step, lambda: _open_page(at, "🖨️ In đơn hàng"))
+        step = "in đơn: dựng hóa đơn"
+        recorder.timed(step, lambda: _check(_by_label(at.button, "In tất cả đơn chưa soạn").click().run()))
+
+        step = "dashboard"
+        recorder.timed(step, lambda: _open_page(at, "📊 Con số biết nói"))
+    except Exception as e:
+        recorder.fail(session_no, step, e)
+
+
+def _share_runtime_between_sessions():
+    """AppTest vốn chạy tuần tự: mỗi lượt run gán rồi xóa Runtime._instance & st.secrets toàn cục.
+    Cho mọi phiên dùng chung 1 runtime giả và 1 bộ secrets (không truyền at.secrets) để chạy song song được.
+    Mỗi lượt run cũng tạo ScriptCache mới nên các luồng biên dịch app.py cùng lúc (thỉnh thoảng SystemError
+    trong ast): dùng chung 1 ScriptCache để app.py chỉ được biên dịch 1 lần, dưới khóa của ScriptCache.
+    """
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime.instance = classmethod(lambda cls: runtime)
+    Runtime.exists = classmethod(lambda cls: True)
+    secrets = Secrets()
+    secrets._secrets = dict(SECRETS)
+    st.secrets = secrets
+    script_cache = ScriptCache()
+    app_test_module.ScriptCache = lambda: script_cache
+
+
+def _percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test nhiều phiên đồng thời chạy app.py trên bảng tính giả lập")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--orders", type=int, default=2000, help="Số đơn có sẵn trên sheet giả lập")
+    parser.add_argument("--latency", type=float, default=0.2, help="Độ trễ mỗi lệnh gọi API (giây)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Xác suất 1 lệnh gọi bị lỗi 429")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    # Luồng của harness gọi các hàm cache ngoài lượt chạy script: bỏ cảnh báo "missing ScriptRunContext"
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").disabled = True
+    spreadsheet = FakeSpreadsheet(args.orders, latency=args.latency, error_rate=args.error_rate)
+    # Thay client gspread thật bằng bảng tính giả; outbox & snapshot lưu đĩa ghi vào thư mục tạm thay vì .cache/ của app
+    ServiceAccountCredentials.from_json_keyfile_dict = staticmethod(lambda *a, **k: None)
+    gspread.authorize = lambda creds: FakeClient(spreadsheet)
+    scratch_dir = tempfile.mkdtemp(prefix="oliu-load-")
+    outbox_module.OUTBOX_DB_PATH = os.path.join(scratch_dir, "outbox.sqlite3")
+    snapshot_cache_module.SNAPSHOT_CACHE_DIR = os.path.join(scratch_dir, "snapshot")
+    _share_runtime_between_sessions()
+
+    recorder = SessionRecorder()
+    app_path = os.path.join(ROOT, "app.py")
+    # Dựng sẵn mọi AppTest ở luồng chính trước khi chạy song song, các luồng chỉ còn bấm & chạy lại
+    apps = [AppTest.from_file(app_path, default_timeout=RERUN_TIMEOUT) for _ in range(args.sessions + 1)]
+
+    # Phiên khởi động: nạp các cache dùng chung (client, snapshot, bảng đơn, bytecode app.py...) như server đã chạy sẵn
+    run_session(0, apps[0], SessionRecorder())
+    calls_before = spreadsheet.calls
+
+    tracemalloc.start()
+    mem_before = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(target=run_session, args=(i, apps[i], recorder), daemon=True)
+        for i in range(1, args.sessions + 1)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+    mem_after, mem_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Chờ outbox đẩy hết đơn lên sheet giả để đếm cả lệnh ghi
+    deadline = time.time() + 60
+    outbox = get_order_outbox(None, FAKE_URL)
+    while outbox.depth() and time.time() < deadline:
+        time.sleep(0.2)
+
+    calls = spreadsheet.calls - calls_before
+    print(f"# {args.sessions} phiên đồng thời, {args.orders:,} đơn, latency={args.latency}s, "
+          f"error_rate={args.error_rate}, tổng {wall:.1f}s")
+    print(f"{'bước':<28}{'n':>5}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}  (ms)")
+    for step, values in recorder.samples.items():
+        print(f"{step:<28}{len(values):>5}{statistics.median(values):>10.0f}{_percentile(values, 0.9):>10.0f}"
+              f"{_percentile(values, 0.99):>10.0f}{max(values):>10.0f}")
+    print(f"Sheets API: {calls} lệnh gọi ({calls / args.sessions:.2f}/phiên), "
+          f"{spreadsheet.sheet1.quota_errors + spreadsheet.stock.quota_errors} lỗi 429 giả lập, "
+          f"outbox còn {outbox.depth()} đơn")
+    print(f"Bộ nhớ: {(mem_after - mem_before) / args.sessions / 1024:.0f} KiB/phiên "
+          f"(đỉnh {(mem_peak - mem_before) / 1024 / 1024:.1f} MiB cho cả lượt; tracemalloc làm chậm các số đo trên)")
+    if recorder.errors:
+        print(f"{len(recorder.errors)} phiên lỗi:")
+        for error in recorder.errors:
+            print("  -", error)
+    return 1 if recorder.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+# benchmarks/run_benchmarks.py
+"""Đo thời gian các bước xử lý chính của app trên bảng tính giả lập 1k/10k/100k đơn.
+
+Chạy từ thư mục gốc repo:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --sizes 1000 10000 --latency 0.2 --repeat 5
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+warnings.filterwarnings("ignore")
+
+from config import (
+    GIA_ROW_VALUE, GIA_ROW_NAME, GIA_ROW_START, GIA_ROW_END, HANG_TON_NAME_START, HANG_TON_NAME_END,
+    HANG_TON_VALUE_START, HANG_TON_VALUE_END, SHEET_HANG_TON_NAME, DA_SOAN_DON, COT_STT, PRINT_CHUNK_SIZE
+)
+from util import get_gia_hang, get_stock, get_stock_data
+from sheet_store import SnapshotStore
+from order_table import build_order_table
+from sales_aggregates import AggregateStore
+from views.order_print import render_print_jobs_html
+from fake_sheets import FakeSpreadsheet, PRODUCTS, SHEET_WIDTH
+
+
+def _time(fn, repeat: int) -> tuple:
+    """(trung vị ms, kết quả lần chạy cuối)."""
+    samples, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), result
+
+
+def _append_order(worksheet, stt: int):
+    row = [""] * SHEET_WIDTH
+    row[0], row[1], row[2] = str(stt), "Benchmark TNV", "Khách benchmark"
+    row[GIA_ROW_START] = "1"
+    worksheet.grid.append(row)
+
+
+def run_size(n_orders: int, latency: float, repeat: int) -> list:
+    spreadsheet = FakeSpreadsheet(n_orders, latency=latency)
+    sheet, stock_sheet = spreadsheet.sheet1, spreadsheet.worksheet(SHEET_HANG_TON_NAME)
+    results = []
+
+    def full_sync():
+        return SnapshotStore(ttl=60, verify_rows=20, full_sync_interval=600).get(sheet)
+
+    ms, snapshot = _time(full_sync, repeat)
+    results.append(("snapshot full sync", ms))
+
+    ms, _ = _time(lambda: get_gia_hang(snapshot.rows, row_value=GIA_ROW_VALUE, row_name=GIA_ROW_NAME,
+                                       row_start=GIA_ROW_START, row_end=GIA_ROW_END), repeat)
+    results.append(("get_gia_hang", ms))
+    price_catalog = get_gia_hang(snapshot.rows, GIA_ROW_VALUE, GIA_ROW_NAME, GIA_ROW_START, GIA_ROW_END)
+
+    name_range = f"{HANG_TON_NAME_START}:{HANG_TON_NAME_END}"
+    value_range = f"{HANG_TON_VALUE_START}:{HANG_TON_VALUE_END}"
+    ms, _ = _time(lambda: get_stock(*get_stock_data(stock_sheet, name_range, value_range)), repeat)
+    results.append(("get_stock (batch_get + parse)", ms))
+
+    ms, order_table = _time(lambda: build_order_table(snapshot.rows, snapshot.version), repeat)
+    results.append(("build_order_table", ms))
+
+    ms, _ = _time(lambda: AggregateStore().get(order_table, None), repeat)
+    results.append(("dashboard aggregates (full)", ms))
+
+    # Cập nhật tăng dần: thêm 1 đơn mới rồi đồng bộ delta + cộng dồn số liệu
+    store = SnapshotStore(ttl=60, verify_rows=20, full_sync_interval=600)
+    aggregates = AggregateStore()
+    aggregates.get(build_order_table(store.get(sheet).rows, store.get(sheet).version), store)
+    next_stt = [n_orders + 1]
+
+    def incremental():
+        _append_order(sheet, next_stt[0])
+        next_stt[0] += 1
+        store.invalidate()
+        snap = store.get(sheet)
+        return aggregates.get(build_order_table(snap.rows, snap.version), store)
+
+    ms, _ = _time(incremental, repeat)
+    results.append(("delta sync + table + aggregates", ms))
+
+    rnd = random.Random(n_orders)
+    lookups = [rnd.randint(1, n_orders) for _ in range(1000)]
+    ms, _ = _time(lambda: [order_table.find(stt) for stt in lookups], repeat)
+    results.append(("lookup x1000 (find by STT)", ms))
+
+    ms, _ = _time(lambda: build_order_table(snapshot.rows, snapshot.version).search_index, repeat)
+    results.append(("build table + search index", ms))
+    # Dựng chỉ mục (cached_property) trước khi bấm giờ: chi phí dựng đã đo riêng ở dòng trên
+    search_index = order_table.search_index
+    ms, _ = _time(lambda: search_index.search("hanh", 50), repeat)
+    results.append(("search 'hanh'", ms))
+
+    df = order_table.df
+    stt_list = df.loc[~df[DA_SOAN_DON], COT_STT].dropna().astype(int).tolist()[:PRINT_CHUNK_SIZE]
+    ms, _ = _time(lambda: render_print_jobs_html(order_table, stt_list, price_catalog), repeat)
+    results.append((f"print job html (1 lô {len(stt_list)} đơn)", ms))
+
+    results.append(("Sheets API calls (tổng)", spreadsheet.calls))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline trên bảng tính giả lập")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--latency", type=float, default=0.0, help="Độ trễ giả lập mỗi lệnh gọi API (giây)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"# {len(PRODUCTS)} SKU, latency={args.latency}s, repeat={args.repeat} (trung vị, ms)")
+    table = {n: dict(run_size(n, args.latency, args.repeat)) for n in args.sizes}
+    names = list(next(iter(table.values())))
+    width = max(len(name) for name in names)
+    print(f"{'':<{width}}  " + "  ".join(f"{n:>10,}" for n in args.sizes))
+    for name in names:
+        print(f"{name:<{width}}  " + "  ".join(f"{table[n][name]:>10.1f}" for n in args.sizes))
+
+
+if __name__ == "__main__":
+    main()
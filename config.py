@@ -14,7 +14,74 @@ HANG_TON_VALUE_END = "Q26"
 SHEET_HANG_TON_NAME = "Quản lí tồn" 
 TIEN_BAN_HANG = "TIỀN BÁN HÀNG (2)" 
 
-MENU_TREE = ["📥 Nhập đơn hàng", "📄 Tra cứu đơn hàng", "🖨️ In đơn hàng", "📊 Con số biết nói", "👉 Về chúng tôi"]
+# Tên các cột trên sheet đơn hàng (đã bỏ ký tự xuống dòng \n trong tiêu đề)
+COT_STT = "STT"
+COT_TEN_TNV = "TÊN TNV BÁN"
+COT_CHI_TIET_DON = "CHI TIẾT ĐƠN (VUI LÒNG ĐIỀN CHÍNH XÁC VỚI Ô CỘT SỐ LƯỢNG BÊN PHẢI)"
+TONG_TIEN_CAN_TRA = "TỔNG TIỀNCẦN TRẢ(1)+(2)"
+DA_THANH_TOAN = "Đã thanh toán"
+DA_SOAN_DON = "ĐÃ SOẠN ĐƠN"
+DA_GIAO_TNV = "ĐÃ GIAO TNV(TNV điền hoặc người giao điền)"
+# Vị trí cột (0-based) được đưa vào chỉ mục tìm kiếm: Tên TNV bán, Tên khách, SĐT khách
+SEARCH_COLUMN_INDEXES = (1, 2, 4)
+SEARCH_RESULT_LIMIT = 50
+# Số chuỗi khác nhau được nhớ kết quả bỏ dấu/chuẩn hóa (tên TNV/khách, nội dung chuyển khoản, tên mặt hàng)
+TEXT_CACHE_SIZE = 65536
+
+# Thời gian sống (giây) của snapshot sheet đơn hàng dùng chung cho mọi phiên
+SNAPSHOT_TTL_SECONDS = 60
+# Đồng bộ delta: chỉ tải phần đuôi sheet, đọc lại thêm vài dòng cuối để bắt các sửa đổi tay trên Sheets
+DELTA_VERIFY_ROWS = 20
+# Chu kỳ (giây) bắt buộc tải lại toàn bộ sheet để đối soát, đề phòng sửa/xóa ở các dòng cũ
+FULL_SYNC_INTERVAL_SECONDS = 600
+# --- LÀM MỚI DỮ LIỆU Ở LUỒNG NỀN (snapshot đơn hàng, bảng giá, số tồn kho) ---
+REFRESH_INTERVAL_SECONDS = 30        # Chu kỳ thường, phải nhỏ hơn SNAPSHOT_TTL_SECONDS
+SALE_REFRESH_INTERVAL_SECONDS = 10   # Chu kỳ trong khung giờ mở bán
+SALE_TIMEZONE = "Asia/Ho_Chi_Minh"
+SALE_WINDOWS = [("11:00", "13:30"), ("19:00", "22:30")]  # Khung giờ mở bán hằng ngày (giờ bắt đầu, giờ kết thúc)
+# Lưu snapshot sheet đơn hàng & số tồn xuống đĩa (Parquet) để khởi động lại hiển thị được ngay (.cache/ nằm trong .gitignore)
+SNAPSHOT_CACHE_DIR = ".cache/snapshot"
+SNAPSHOT_PERSIST_INTERVAL_SECONDS = 30
+
+# Giới hạn tốc độ gọi Google Sheets API dùng chung cho toàn tiến trình (hạn ngạch mặc định 60 lệnh/phút/tài khoản)
+SHEETS_RATE_PER_MINUTE = 55
+SHEETS_BURST = 10
+
+# --- HÀNG ĐỢI GHI ĐƠN CỤC BỘ (OUTBOX) KHI GOOGLE SHEETS QUÁ TẢI ---
+OUTBOX_DB_PATH = ".cache/outbox.sqlite3"
+OUTBOX_BATCH_SIZE = 200          # Số đơn tối đa gộp trong 1 lệnh batch_update
+OUTBOX_FLUSH_DELAY_SECONDS = 0.5 # Chờ ngắn để gộp các đơn gửi gần như cùng lúc
+OUTBOX_MAX_BACKOFF_SECONDS = 60
+OUTBOX_MAX_ATTEMPTS = 5          # Đơn bị Sheets từ chối (lỗi không phải 429/5xx/mạng) quá số lần này thì chuyển sang bảng đơn lỗi
+
+# --- NHẬP ĐƠN HÀNG LOẠT TỪ FILE CSV/EXCEL ---
+# Cột thông tin đơn trong file nhập, đúng thứ tự cột B..H trên sheet đơn hàng; cột mặt hàng đặt tên theo SKU
+IMPORT_INFO_COLUMNS = (
+    "Tên TNV bán", "Tên khách", "Chi tiết đơn", "SĐT khách",
+    "Địa chỉ", "Quận/Tỉnh", "Thời gian nhận hàng",
+)
+IMPORT_REQUIRED_COLUMNS = ("Tên TNV bán", "Tên khách")
+IMPORT_MAX_ORDERS = OUTBOX_BATCH_SIZE  # Cả file được đẩy lên sheet trong 1 lệnh batch_update
+
+# --- ĐO HIỆU NĂNG TỪNG LƯỢT RERUN (bảng ẩn bật bằng secret/biến môi trường PERF_PANEL, log bằng PERF_LOG_PATH) ---
+PERF_TRACE_HISTORY = 20          # Số lượt chạy gần nhất giữ lại cho mỗi phiên
+
+# --- XUẤT METRICS DẠNG PROMETHEUS (bật bằng secret/biến môi trường METRICS_PORT và/hoặc METRICS_FILE_PATH) ---
+METRICS_HOST = "127.0.0.1"       # Chỉ mở cho scraper chạy cùng máy
+METRICS_FILE_INTERVAL_SECONDS = 15
+
+# --- ĐỐI SOÁT SAO KÊ NGÂN HÀNG VỚI CỘT "Đã thanh toán" ---
+# Tên cột (đã viết hoa) có thể có trong file sao kê của các ngân hàng, ưu tiên theo thứ tự
+BANK_MEMO_COLUMNS = ("NỘI DUNG", "NỘI DUNG GIAO DỊCH", "NỘI DUNG CHUYỂN KHOẢN", "DIỄN GIẢI", "MÔ TẢ",
+                     "DESCRIPTION", "REMARK", "REMARKS", "NARRATIVE", "TRANSACTION DETAILS")
+BANK_AMOUNT_COLUMNS = ("SỐ TIỀN GHI CÓ", "GHI CÓ", "PHÁT SINH CÓ", "SỐ TIỀN", "CREDIT", "CREDIT AMOUNT", "AMOUNT")
+RECONCILE_NAME_SIMILARITY = 0.8  # Độ giống tối thiểu (0..1) giữa tên TNV trong nội dung và trên sheet
+RECONCILE_CACHE_ENTRIES = 8       # Số kết quả đối soát (file sao kê x phiên bản snapshot) giữ trong bộ nhớ đệm
+
+# --- IN HÓA ĐƠN HÀNG LOẠT ---
+PRINT_CHUNK_SIZE = 50  # Số đơn tối đa trong 1 lệnh in (1 iframe), giữ bộ nhớ trình duyệt ổn định trên máy yếu
+
+MENU_TREE = ["📥 Nhập đơn hàng", "📤 Nhập đơn hàng loạt", "📄 Tra cứu đơn hàng", "🖨️ In đơn hàng", "💰 Đối soát chuyển khoản", "📊 Con số biết nói", "👉 Về chúng tôi"]
 
 # --- DANH MỤC SKU MẶT HÀNG ---
 MIT_500G = "MÍT 500G"
@@ -59,6 +126,14 @@ product_column_map = {
     TUI_DUNG_DT: 39      # Cột AM
 }
 
+# Mặt hàng bán theo combo trừ vào cùng một dòng tồn kho: {SKU: (tên dòng tồn kho, số đơn vị mỗi combo)}
+STOCK_BUNDLES = {
+    NEP_CHAY_CHA_BONG_150G_X3: ("NẾP CHÁY CHÀ BÔNG 150G", 3),
+    NEP_CHAY_CHA_BONG_150G_X5: ("NẾP CHÁY CHÀ BÔNG 150G", 5),
+}
+# Thời gian (giây) giữ chỗ hàng cho một đơn đang mở hộp thoại xác nhận
+STOCK_RESERVATION_TTL_SECONDS = 300
+
 thoi_gian_nhan_hang = ["", "Nhận trực tiếp - Trưa thứ 7", "Bookship - Chiều thứ 7", "Bookship - Chủ nhật"]
 TARGET_SALES = 200000000
 SCOPE = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
@@ -68,6 +143,13 @@ STK = "2845"
 TEN_CHU_TK = "PHAM THI CAM TU"
 BIN_BANK = "970422"
 
+# --- ẢNH TRANG GIỚI THIỆU (được thu nhỏ & nén WebP sẵn, phục vụ qua static file serving) ---
+IMAGE_SOURCE_DIRS = ("static", "image")
+IMAGE_OUTPUT_DIR = "static/optimized"
+IMAGE_MAX_SIZE = (1200, 460)  # Slider hiển thị cao 230px -> giữ gấp đôi cho màn hình retina
+IMAGE_QUALITY = 78
+IMAGE_STATIC_URL = "app/static/optimized"
+
 # --- HIỆU ỨNG ANIMATION MÈO CHÓ CHẠY ĐÁY MÀN HÌNH ---
 MEO_HTML = """
 <div id="neko-container" style="position: fixed; bottom: 0; left: 0; font-size: 35px; z-index: 9999;">
@@ -136,6 +218,16 @@ PRINT_MULTI_HTML = """
     </html>
     """
 
+# Khung HTML của 1 hóa đơn trong lệnh in hàng loạt (các dòng <tr> được sinh sẵn theo lô)
+INVOICE_BLOCK_HTML = """
+        <div class="order" style="page-break-after: always; border-bottom: 2px dashed #000; padding-bottom: 15px; margin-bottom: 25px;">
+            <h3 style="text-align:center; font-family: sans-serif;">📄 Đơn hàng STT: {stt}</h3>
+            <table border="1" class="dataframe"><thead><tr style="text-align: right;"><th>Mục</th><th>Nội dung</th></tr></thead><tbody>{info_rows}</tbody></table>
+            <br>
+            <table border="1" class="dataframe"><thead><tr style="text-align: right;"><th>Sản phẩm</th><th>Số lượng</th></tr></thead><tbody>{item_rows}</tbody></table>
+        </div>
+        """
+
 TIEU_DE_HTML = """
 <style> .hero-title {text-align: left; color: #1E3A8A; font-size: 3em; font-weight: bold; font-family: 'Montserrat', sans-serif;} .section-title {font-size: 2em; font-weight: 700; margin: 40px 0 20px; color: #002B5B;} </style>
 <div class="hero-title"> <h1>Đội tình nguyện ÔLiu</h1> </div>
@@ -0,0 +1,95 @@
+# image_pipeline.py
+"""Tạo sẵn ảnh đã thu nhỏ & nén lại (WebP) cho trang giới thiệu, kèm manifest đặt tên theo hash nội dung.
+
+Chạy trước khi deploy:  python image_pipeline.py
+(App cũng tự chạy bước này ở lần đầu mở trang "Về chúng tôi" sau khi khởi động nếu chưa có manifest, hoặc ảnh nguồn
+đã được thêm/xóa/thay thế so với lúc build: manifest lưu kích thước & thời điểm sửa của từng ảnh nguồn.)
+"""
+import hashlib
+import json
+import os
+
+from config import IMAGE_SOURCE_DIRS, IMAGE_OUTPUT_DIR, IMAGE_MAX_SIZE, IMAGE_QUALITY
+
+MANIFEST_NAME = "manifest.json"
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+
+def _content_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()[:10]
+
+
+def _source_files(source_dirs) -> dict:
+    """{đường dẫn ảnh nguồn: (kích thước, mtime)} của mọi ảnh trong các thư mục nguồn."""
+    sources = {}
+    for source_dir in source_dirs:
+        if not os.path.isdir(source_dir):
+            continue
+        for name in sorted(os.listdir(source_dir)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                src = os.path.join(source_dir, name)
+                stat = os.stat(src)
+                sources[src.replace(os.sep, "/")] = (stat.st_size, stat.st_mtime)
+    return sources
+
+
+def build_image_manifest(source_dirs=IMAGE_SOURCE_DIRS, output_dir=IMAGE_OUTPUT_DIR,
+                         max_size=IMAGE_MAX_SIZE, quality=IMAGE_QUALITY) -> dict:
+    """Sinh biến thể WebP cho mọi ảnh nguồn (bỏ qua ảnh đã có), trả về {đường dẫn gốc: thông tin biến thể}."""
+    from PIL import Image, ImageOps
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {}
+    for src, (size, mtime) in _source_files(source_dirs).items():
+        stem = os.path.splitext(os.path.basename(src))[0]
+        out_name = f"{stem}-{_content_hash(src)}.webp"
+        out_path = os.path.join(output_dir, out_name)
+        if not os.path.exists(out_path):
+            with Image.open(src) as img:
+                img = ImageOps.exif_transpose(img).convert("RGB")
+                img.thumbnail(max_size)
+                img.save(out_path, "WEBP", quality=quality, method=6)
+        with Image.open(out_path) as variant:
+            width, height = variant.size
+        manifest[src] = {
+            "file": out_name, "path": out_path.replace(os.sep, "/"), "width": width, "height": height,
+            "source_size": size, "source_mtime": mtime,
+        }
+
+    # Xóa biến thể cũ của ảnh nguồn đã bị thay/xóa
+    current = {v["file"] for v in manifest.values()}
+    for name in os.listdir(output_dir):
+        if name.endswith(".webp") and name not in current:
+            os.remove(os.path.join(output_dir, name))
+
+    with open(os.path.join(output_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def _is_current(manifest: dict, sources: dict) -> bool:
+    if manifest.keys() != sources.keys():
+        return False  # Có ảnh nguồn mới hoặc ảnh đã bị xóa
+    return all(
+        (v.get("source_size"), v.get("source_mtime")) == sources[src] and os.path.exists(v["path"])
+        for src, v in manifest.items()
+    )
+
+
+def load_image_manifest(source_dirs=IMAGE_SOURCE_DIRS, output_dir=IMAGE_OUTPUT_DIR) -> dict:
+    """Đọc manifest đã build; tự build lại nếu thiếu file, hoặc ảnh nguồn đã được thêm/xóa/thay thế
+    (so kích thước & mtime, không cần đọc nội dung ảnh)."""
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if _is_current(manifest, _source_files(source_dirs)):
+            return manifest
+    return build_image_manifest(source_dirs=source_dirs, output_dir=output_dir)
+
+
+if __name__ == "__main__":
+    for src, variant in build_image_manifest().items():
+        before, after = os.path.getsize(src), os.path.getsize(variant["path"])
+        print(f"{src}: {before / 1024:.0f} KB -> {variant['file']} {after / 1024:.0f} KB")
@@ -0,0 +1,226 @@
+# metrics.py
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import streamlit as st
+
+from config import METRICS_HOST, METRICS_FILE_INTERVAL_SECONDS
+
+# Mốc (giây) cho các histogram độ trễ: từ lệnh ghi cục bộ vài ms tới lệnh đọc cả sheet lúc quá tải
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape_label(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def samples(self) -> list:
+        """[(tên mẫu, tên nhãn, giá trị nhãn, giá trị)] theo định dạng text của Prometheus."""
+        with self._lock:
+            return [(self.name, self.labelnames, key, value) for key, value in sorted(self._values.items())]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        super().__init__(name, help_text, labelnames)
+        self._function = None
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, fn):
+        """Giá trị được tính lúc scrape (VD: tuổi snapshot, số đơn trong outbox)."""
+        self._function = fn
+
+    def samples(self) -> list:
+        if self._function is not None:
+            try:
+                value = self._function()
+            except Exception:
+                return []
+            return [] if value is None else [(self.name, (), (), value)]
+        return super().samples()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> list:
+        out = []
+        with self._lock:
+            items = [(key, (list(counts), total)) for key, (counts, total) in sorted(self._values.items())]
+        for key, (counts, total) in items:
+            for bound, count in zip(self.buckets, counts):
+                out.append((f"{self.name}_bucket", self.labelnames + ("le",), key + (_format_value(bound),), count))
+            out.append((f"{self.name}_sum", self.labelnames, key, total))
+            out.append((f"{self.name}_count", self.labelnames, key, counts[-1]))
+        return out
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample_name, names, values, value in metric.samples():
+                lines.append(f"{sample_name}{_format_labels(names, values)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Registry toàn tiến trình: luồng script, luồng nền outbox và luồng exporter cùng ghi/đọc (không cần ScriptRunContext)
+REGISTRY = MetricsRegistry()
+
+SHEETS_API_CALLS = REGISTRY.register(Counter(
+    "oliu_sheets_api_calls_total", "Lệnh gọi Google Sheets API thực sự gửi đi, theo hàm gspread.", ("method",)))
+SHEETS_API_ERRORS = REGISTRY.register(Counter(
+    "oliu_sheets_api_errors_total", "Lệnh gọi Google Sheets API bị lỗi, theo hàm gspread và mã lỗi (429 = hết hạn ngạch).",
+    ("method", "status")))
+SHEETS_COALESCED_READS = REGISTRY.register(Counter(
+    "oliu_sheets_coalesced_reads_total", "Lệnh đọc được gộp vào 1 request giống hệt đang chạy (không tốn hạn ngạch)."))
+SHEET_READ_SECONDS = REGISTRY.register(Histogram(
+    "oliu_sheet_read_seconds", "Thời gian đọc sheet đơn hàng (gồm cả thử lại khi dính 429).", ("kind",)))
+SNAPSHOT_AGE_SECONDS = REGISTRY.register(Gauge(
+    "oliu_snapshot_age_seconds", "Tuổi snapshot sheet đơn hàng đang dùng chung."))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "oliu_cache_requests_total", "Số lần đọc qua bộ nhớ đệm, theo tên cache.", ("cache",)))
+CACHE_MISSES = REGISTRY.register(Counter(
+    "oliu_cache_misses_total", "Số lần bộ nhớ đệm phải tính/tải lại, theo tên cache.", ("cache",)))
+ORDER_SUBMIT_SECONDS = REGISTRY.register(Histogram(
+    "oliu_order_submit_seconds", "Thời gian xử lý nút Gửi đơn (cấp STT + đưa vào outbox), theo nguồn form/import.",
+    ("source",), buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)))
+ORDERS_SUBMITTED = REGISTRY.register(Counter(
+    "oliu_orders_submitted_total", "Số đơn đã tiếp nhận qua app."))
+OUTBOX_DEPTH = REGISTRY.register(Gauge(
+    "oliu_outbox_pending_orders", "Số đơn đang chờ đẩy lên Google Sheets."))
+OUTBOX_DEAD_LETTERS = REGISTRY.register(Gauge(
+    "oliu_outbox_dead_letter_orders", "Số đơn bị Google Sheets từ chối quá OUTBOX_MAX_ATTEMPTS lần, cần xử lý tay."))
+ACTIVE_SESSIONS = REGISTRY.register(Gauge(
+    "oliu_active_sessions", "Số phiên trình duyệt đang kết nối."))
+
+
+def _count_active_sessions():
+    from streamlit.runtime import Runtime
+    if not Runtime.exists():
+        return None
+    session_mgr = getattr(Runtime.instance(), "_session_mgr", None)
+    return session_mgr.num_active_sessions() if session_mgr is not None else None
+
+
+ACTIVE_SESSIONS.set_function(_count_active_sessions)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def write_metrics_file(path: str):
+    """Ghi nguyên tử (file tạm + rename) để scraper không đọc phải file ghi dở."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(REGISTRY.render())
+    os.replace(tmp_path, path)
+
+
+def _write_metrics_file_loop(path: str, interval: float):
+    while True:
+        try:
+            write_metrics_file(path)
+        except OSError as e:
+            print(f"Không ghi được file metrics {path}: {e}")
+        time.sleep(interval)
+
+
+@st.cache_resource
+def start_metrics_exporter(port: str, file_path: str) -> bool:
+    """Mở endpoint /metrics (METRICS_PORT) và/hoặc ghi file định kỳ (METRICS_FILE_PATH); chạy 1 lần mỗi tiến trình."""
+    if port:
+        server = ThreadingHTTPServer((METRICS_HOST, int(port)), _MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    if file_path:
+        threading.Thread(
+            target=_write_metrics_file_loop, args=(file_path, METRICS_FILE_INTERVAL_SECONDS),
+            name="metrics-file", daemon=True,
+        ).start()
+    return bool(port or file_path)
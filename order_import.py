@@ -0,0 +1,125 @@
+# order_import.py
+import io
+import math
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from config import IMPORT_INFO_COLUMNS, IMPORT_REQUIRED_COLUMNS, product_column_map, thoi_gian_nhan_hang
+from order_writer import build_order_row
+from util import normalize_key
+
+COT_THOI_GIAN_NHAN = "Thời gian nhận hàng"
+COT_CHI_TIET = "Chi tiết đơn"
+
+
+def _compact_key(text: str) -> str:
+    # Bỏ mọi khoảng trắng/xuống dòng: tiêu đề bảng giá trên sheet đôi khi bị xuống dòng giữa tên
+    return "".join(str(text).upper().split())
+
+
+@dataclass
+class ImportedOrder:
+    """Một dòng trong file nhập đã được kiểm tra."""
+    line: int                      # Số dòng trong file (tính cả dòng tiêu đề) để TNV dễ tìm lại
+    info: dict
+    items: dict                    # {SKU: số lượng}
+    total: int = 0                 # Tiền hàng ước tính theo bảng giá (chưa gồm phí ship)
+    errors: list = field(default_factory=list)
+
+    def to_row(self) -> list:
+        return build_order_row([self.info.get(name, "") for name in IMPORT_INFO_COLUMNS], self.items)
+
+
+def build_import_template() -> bytes:
+    """File CSV mẫu (UTF-8 có BOM để Excel hiển thị đúng tiếng Việt)."""
+    columns = list(IMPORT_INFO_COLUMNS) + sorted(product_column_map, key=product_column_map.get)
+    return pd.DataFrame(columns=columns).to_csv(index=False).encode("utf-8-sig")
+
+
+def read_import_file(file_name: str, data: bytes) -> pd.DataFrame:
+    """Đọc file CSV hoặc Excel (.xlsx) thành bảng chuỗi, ô trống là ''."""
+    if file_name.lower().endswith((".xlsx", ".xls")):
+        df = pd.read_excel(io.BytesIO(data), dtype=str)
+    else:
+        df = pd.read_csv(io.BytesIO(data), dtype=str, encoding="utf-8-sig", keep_default_na=False)
+    return df.fillna("").apply(lambda col: col.str.strip())
+
+
+def _parse_quantity(value: str):
+    value = str(value).strip()
+    if value == "":
+        return 0
+    try:
+        qty = float(value.replace(",", "."))
+    except ValueError:
+        return None
+    # 'inf' / '1e999' / 'nan' vẫn đọc được thành float nhưng không phải số lượng
+    if not math.isfinite(qty):
+        return None
+    return int(qty) if qty >= 0 and qty == int(qty) else None
+
+
+def validate_import(df: pd.DataFrame, price_catalog: dict) -> tuple:
+    """Khớp cột theo tên (không phân biệt hoa thường/khoảng trắng) rồi kiểm tra từng dòng.
+
+    Trả về (danh sách ImportedOrder, lỗi cấp file). Dòng trống hoàn toàn được bỏ qua.
+    """
+    info_by_key = {normalize_key(name): name for name in IMPORT_INFO_COLUMNS}
+    sku_by_key = {normalize_key(sku): sku for sku in product_column_map}
+    prices = {_compact_key(name): price for name, price in price_catalog.items()}
+    allowed_times = {normalize_key(t): t for t in thoi_gian_nhan_hang}
+
+    info_columns, sku_columns, file_errors = {}, {}, []
+    for column in df.columns:
+        key = normalize_key(column)
+        if key in info_by_key:
+            info_columns[column] = info_by_key[key]
+        elif key in sku_by_key:
+            sku_columns[column] = sku_by_key[key]
+        elif key and not key.startswith("UNNAMED"):
+            file_errors.append(f"Cột '{column}' không khớp thông tin đơn hay mặt hàng nào, sẽ bị bỏ qua.")
+    missing = [name for name in IMPORT_REQUIRED_COLUMNS if name not in info_columns.values()]
+    if missing:
+        file_errors.append("Thiếu cột bắt buộc: " + ", ".join(missing))
+    if not sku_columns:
+        file_errors.append("File không có cột mặt hàng nào (tên cột phải trùng tên SKU, VD: MÍT 500G).")
+
+    orders = []
+    for pos, record in enumerate(df.to_dict("records")):
+        if not any(str(v).strip() for v in record.values()):
+            continue
+        order = ImportedOrder(line=pos + 2, info={}, items={})
+        for column, name in info_columns.items():
+            order.info[name] = record[column]
+        for name in IMPORT_REQUIRED_COLUMNS:
+            if not order.info.get(name):
+                order.errors.append(f"thiếu {name}")
+
+        if order.info.get(COT_THOI_GIAN_NHAN):
+            matched_time = allowed_times.get(normalize_key(order.info[COT_THOI_GIAN_NHAN]))
+            if matched_time is None:
+                order.errors.append(f"thời gian nhận '{order.info[COT_THOI_GIAN_NHAN]}' không có trong danh sách")
+            else:
+                order.info[COT_THOI_GIAN_NHAN] = matched_time
+
+        for column, sku in sku_columns.items():
+            qty = _parse_quantity(record[column])
+            if qty is None:
+                order.errors.append(f"số lượng {sku} không hợp lệ ('{record[column]}')")
+            elif qty:
+                order.items[sku] = order.items.get(sku, 0) + qty
+        if not order.items and not order.errors:
+            order.errors.append("đơn không có mặt hàng nào")
+
+        for sku, qty in order.items.items():
+            price = prices.get(_compact_key(sku))
+            if price is None and prices:
+                order.errors.append(f"{sku} chưa có giá trên bảng giá")
+            order.total += qty * (price or 0)
+
+        if not order.info.get(COT_CHI_TIET):
+            # Giống nội dung TNV tự gõ ở form nhập đơn: "2 MÍT 500G, 1 MẬT ONG 1 LÍT"
+            order.info[COT_CHI_TIET] = ", ".join(f"{qty} {sku}" for sku, qty in order.items.items())
+        orders.append(order)
+    return orders, file_errors
@@ -0,0 +1,141 @@
+# order_table.py
+from bisect import bisect_right
+from functools import cached_property
+
+import pandas as pd
+import streamlit as st
+
+from config import (
+    GIA_ROW_NAME, GIA_ROW_START, GIA_ROW_END, TIEN_BAN_HANG,
+    COT_STT, TONG_TIEN_CAN_TRA, DA_THANH_TOAN, DA_SOAN_DON, DA_GIAO_TNV, SEARCH_COLUMN_INDEXES
+)
+from util import clean_money_column, convert_name
+from metrics import CACHE_REQUESTS, CACHE_MISSES
+
+MONEY_COLUMNS = [TONG_TIEN_CAN_TRA, TIEN_BAN_HANG]
+STATUS_COLUMNS = [DA_THANH_TOAN, DA_SOAN_DON, DA_GIAO_TNV]
+
+
+class OrderTable:
+    """Bảng đơn hàng đã làm sạch 1 lần cho mỗi phiên bản snapshot, dùng chung (chỉ đọc) cho mọi view.
+
+    - Tiêu đề cột đã bỏ '\\n' và loại cột trùng tên.
+    - Cột số lượng sản phẩm và cột tiền là số nguyên, cột trạng thái là bool, STT là Int64.
+    - Chỉ số dòng `pos` của df ứng với dòng `pos + GIA_ROW_NAME + 2` trên Google Sheets.
+    """
+
+    def __init__(self, version: int, df: pd.DataFrame, product_columns: list, search_columns: list = ()):
+        self.version = version
+        self.df = df
+        self.product_columns = product_columns
+        self.info_columns = [c for c in df.columns if c not in set(product_columns)]
+        self.search_columns = [c for c in search_columns if c in df.columns]
+        # Chỉ mục băm STT -> vị trí dòng: tra cứu O(1) thay vì quét cả cột STT
+        self.stt_index = {}
+        if COT_STT in df.columns:
+            for pos, stt in enumerate(df[COT_STT].tolist()):
+                if stt is not pd.NA and stt not in self.stt_index:
+                    self.stt_index[int(stt)] = pos
+
+    def sheet_row(self, pos: int) -> int:
+        return pos + GIA_ROW_NAME + 2
+
+    def find(self, stt):
+        """Dòng đơn hàng theo STT (pd.Series) hoặc None nếu không tồn tại."""
+        pos = self.stt_index.get(int(stt))
+        return None if pos is None else self.df.iloc[pos]
+
+    @cached_property
+    def search_index(self) -> "OrderSearchIndex":
+        # Chỉ dựng khi có người tìm kiếm lần đầu, sau đó dùng lại cho tới phiên bản snapshot kế tiếp
+        return OrderSearchIndex(self.df, self.search_columns)
+
+
+def _search_key(text) -> str:
+    return convert_name(text) if str(text).strip() else ""
+
+
+class OrderSearchIndex:
+    """Chỉ mục tìm kiếm không dấu trên tên khách, SĐT, tên TNV (cùng cách bỏ dấu với convert_name).
+
+    Mọi khóa được nối thành 1 chuỗi duy nhất để tìm chuỗi con bằng str.find (chạy ở tầng C),
+    rồi ánh xạ vị trí tìm thấy về dòng bằng bisect - dưới 1ms kể cả với hàng chục nghìn đơn.
+    """
+
+    def __init__(self, df: pd.DataFrame, columns: list):
+        # Bỏ dấu theo giá trị duy nhất của từng cột (tên TNV, tên khách lặp lại rất nhiều)
+        column_keys = [df[c].map({v: _search_key(v) for v in df[c].unique()}).tolist() for c in columns]
+        keys = ["|".join(values) for values in zip(*column_keys)]
+        self._offsets = []
+        offset = 0
+        for key in keys:
+            self._offsets.append(offset)
+            offset += len(key) + 1
+        self._haystack = "\n".join(keys)
+
+    def search(self, query: str, limit: int) -> list:
+        """Danh sách vị trí dòng (theo thứ tự trên sheet) có khóa chứa chuỗi truy vấn đã bỏ dấu."""
+        needle = _search_key(query)
+        if not needle:
+            return []
+        found = []
+        start = self._haystack.find(needle)
+        while start != -1 and len(found) < limit:
+            pos = bisect_right(self._offsets, start) - 1
+            found.append(pos)
+            # Nhảy sang đầu dòng kế tiếp để mỗi đơn chỉ xuất hiện 1 lần
+            next_offset = self._offsets[pos + 1] if pos + 1 < len(self._offsets) else len(self._haystack)
+            start = self._haystack.find(needle, next_offset)
+        return found
+
+
+def build_order_table(sheet_data, version: int) -> OrderTable:
+    if len(sheet_data) <= GIA_ROW_NAME:
+        return OrderTable(version, pd.DataFrame(columns=[COT_STT]), [])
+
+    headers = [str(h).replace('\n', '') for h in sheet_data[GIA_ROW_NAME]]
+    df = pd.DataFrame(list(sheet_data[GIA_ROW_NAME + 1:]), columns=headers)
+    df = df.loc[:, ~df.columns.duplicated()].copy()
+    product_columns = [c for c in dict.fromkeys(headers[GIA_ROW_START:GIA_ROW_END]) if c.strip()]
+
+    if product_columns:
+        df[product_columns] = df[product_columns].apply(pd.to_numeric, errors="coerce").fillna(0).astype("int64")
+    for col in MONEY_COLUMNS:
+        if col in df.columns:
+            df[col] = clean_money_column(df[col])
+    for col in STATUS_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype(str).str.strip().str.upper().eq("TRUE")
+    if COT_STT in df.columns:
+        df[COT_STT] = pd.to_numeric(df[COT_STT], errors="coerce").astype("Int64")
+
+    search_columns = [headers[i] for i in SEARCH_COLUMN_INDEXES if i < len(headers)]
+    return OrderTable(version, df, product_columns, search_columns)
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _cached_order_table(snapshot_version, _sheet_data) -> OrderTable:
+    CACHE_MISSES.inc(cache="order_table")
+    return build_order_table(_sheet_data, snapshot_version)
+
+
+def load_order_table(snapshot) -> OrderTable:
+    """Bảng đơn hàng đã parse, memo theo phiên bản snapshot (các lượt rerun không parse lại)."""
+    CACHE_REQUESTS.inc(cache="order_table")
+    return _cached_order_table(snapshot.version, snapshot.rows)
+
+
+def format_vnd(value) -> str:
+    """1200000 -> '1.200.000'"""
+    return f"{int(value):,}".replace(",", ".")
+
+
+def format_cell(column: str, value) -> str:
+    """Chuyển giá trị đã parse về dạng chuỗi hiển thị giống trên Google Sheets."""
+    if value is None or value is pd.NA or (isinstance(value, float) and pd.isna(value)):
+        return ""
+    if column in MONEY_COLUMNS:
+        return format_vnd(value)
+    if column in STATUS_COLUMNS:
+        return "TRUE" if value else "FALSE"
+    return str(value)
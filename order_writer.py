@@ -0,0 +1,126 @@
+# order_writer.py
+import threading
+
+import streamlit as st
+from gspread.utils import rowcol_to_a1
+
+from config import GIA_ROW_NAME, product_column_map
+from order_table import load_order_table
+
+# Số cột của 1 dòng đơn hàng trên sheet (A..AS)
+ORDER_ROW_WIDTH = 45
+
+
+def scan_order_counters(sheet_data) -> tuple:
+    """Từ dữ liệu sheet, tính (STT kế tiếp, dòng trống đầu tiên theo cột B - Tên TNV bán)."""
+    last_filled_row = 0
+    max_stt = 0
+    for idx, row in enumerate(sheet_data):
+        if len(row) > 1 and str(row[1]).strip():
+            last_filled_row = idx + 1
+        if idx >= GIA_ROW_NAME and row and str(row[0]).isdigit():
+            max_stt = max(max_stt, int(row[0]))
+    return max_stt + 1, last_filled_row + 1
+
+
+class OrderAllocator:
+    """Cấp phát STT và số dòng ghi đơn theo kiểu nguyên tử trong tiến trình (khóa + bộ đếm cục bộ).
+
+    Bộ đếm được gieo từ snapshot và chỉ tiến lên, nên hai TNV bấm gửi cùng lúc
+    luôn nhận hai STT/dòng khác nhau thay vì ghi đè lên đơn của nhau.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next_stt = 1
+        self._next_row = 1
+        self._seeded_version = None
+
+    def bump(self, next_stt: int, next_row: int):
+        """Đẩy bộ đếm lên tối thiểu (next_stt, next_row), VD: các đơn còn nằm trong outbox."""
+        with self._lock:
+            self._next_stt = max(self._next_stt, next_stt)
+            self._next_row = max(self._next_row, next_row)
+
+    def allocate(self, snapshot, count: int = 1) -> tuple:
+        """Giữ chỗ `count` đơn liên tiếp, trả về (STT đầu tiên, dòng đầu tiên)."""
+        with self._lock:
+            if snapshot.version != self._seeded_version:
+                seed_stt, seed_row = scan_order_counters(snapshot.rows)
+                self._next_stt = max(self._next_stt, seed_stt)
+                self._next_row = max(self._next_row, seed_row)
+                self._seeded_version = snapshot.version
+            first_stt, first_row = self._next_stt, self._next_row
+            self._next_stt += count
+            self._next_row += count
+            return first_stt, first_row
+
+
+def build_order_row(info_values: list, items: dict) -> list:
+    """Dựng dòng đơn hàng đầy đủ (STT để trống): info_values là các cột B..H, items là {SKU: số lượng}."""
+    row = [""] * ORDER_ROW_WIDTH
+    row[1:1 + len(info_values)] = info_values
+    for sku, qty in items.items():
+        row[product_column_map[sku] - 1] = qty
+    return row
+
+
+def build_row_updates(row_index: int, complete_row: list) -> list:
+    """Chuẩn bị danh sách ô cần ghi của 1 đơn (bỏ qua ô trống/bằng 0 để không đè mất công thức)."""
+    update_data = []
+    for col_idx, value in enumerate(complete_row, start=1):
+        if value != "" and value != 0:
+            update_data.append({
+                'range': rowcol_to_a1(row_index, col_idx),
+                'values': [[value]]
+            })
+    return update_data
+
+
+def build_status_updates(snapshot, order_table, stt_list, column: str, value: str) -> tuple:
+    """Ô cần ghi để đặt cột trạng thái (VD: ĐÃ SOẠN ĐƠN) cho các STT đã có trên sheet.
+
+    Các dòng liền nhau được gộp thành 1 vùng A1. Trả về (update_data cho batch_update,
+    {(dòng, cột) 0-based: giá trị} để vá snapshot). order_table phải dựng từ đúng snapshot này.
+    """
+    headers = [str(h).replace('\n', '') for h in snapshot.rows[GIA_ROW_NAME]] if len(snapshot.rows) > GIA_ROW_NAME else []
+    if column not in headers:
+        return [], {}
+    col_idx = headers.index(column) + 1
+    sheet_rows = sorted({order_table.sheet_row(order_table.stt_index[int(stt)])
+                         for stt in stt_list if int(stt) in order_table.stt_index})
+    update_data, cells = [], {}
+    run_start = None
+    for i, row_index in enumerate(sheet_rows):
+        cells[(row_index - 1, col_idx - 1)] = value
+        if run_start is None:
+            run_start = row_index
+        if i + 1 == len(sheet_rows) or sheet_rows[i + 1] != row_index + 1:
+            a1 = rowcol_to_a1(run_start, col_idx)
+            if row_index != run_start:
+                a1 += ":" + rowcol_to_a1(row_index, col_idx)
+            update_data.append({'range': a1, 'values': [[value]] * (row_index - run_start + 1)})
+            run_start = None
+    return update_data, cells
+
+
+def write_order_rows(sheet_instance, update_data: list):
+    """Đẩy toàn bộ ô của một hoặc nhiều đơn lên Google Sheets trong đúng 1 lệnh batch_update."""
+    if update_data:
+        sheet_instance.batch_update(update_data, value_input_option="USER_ENTERED")
+
+
+def write_status_flags(sheet_instance, snapshot_store, stt_list, column: str, value: str = "TRUE") -> int:
+    """Đặt cột trạng thái cho các đơn trong 1 lệnh batch_update, rồi vá thẳng snapshot dùng chung
+    (không tải lại cả sheet) để mọi phiên thấy ngay. Trả về số đơn đã ghi."""
+    # Số dòng của từng STT phải lấy từ snapshot mới nhất: snapshot cũ/nạp từ đĩa có thể ghi TRUE nhầm dòng
+    snapshot = snapshot_store.get(sheet_instance, wait_for_sheet=True)
+    update_data, cells = build_status_updates(snapshot, load_order_table(snapshot), stt_list, column, value)
+    write_order_rows(sheet_instance, update_data)
+    snapshot_store.patch(cells)
+    return len(cells)
+
+
+@st.cache_resource
+def get_order_allocator() -> OrderAllocator:
+    return OrderAllocator()
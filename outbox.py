@@ -0,0 +1,212 @@
+# outbox.py
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import streamlit as st
+
+from config import (
+    OUTBOX_DB_PATH, OUTBOX_BATCH_SIZE, OUTBOX_FLUSH_DELAY_SECONDS, OUTBOX_MAX_BACKOFF_SECONDS, OUTBOX_MAX_ATTEMPTS
+)
+from order_writer import get_order_allocator, write_order_rows
+from sheet_store import get_snapshot_store
+from stock_ledger import get_stock_ledger
+from util import backoff_delay, is_quota_error, is_retryable_error
+from metrics import OUTBOX_DEPTH, OUTBOX_DEAD_LETTERS
+
+
+class OrderOutbox:
+    """Hàng đợi ghi đơn bền vững (SQLite): nhận đơn ngay lập tức, luồng nền đẩy dần lên Google Sheets.
+
+    Khi Sheets trả 429, lỗi 5xx hoặc lỗi mạng, đơn vẫn nằm an toàn trong file SQLite và được thử lại
+    với backoff lũy thừa + jitter, kể cả sau khi khởi động lại server. Lỗi khác (VD: vùng ghi sai) thì chia đôi lô
+    để tìm đúng đơn lỗi, các đơn còn lại vẫn được ghi; đơn lỗi quá max_attempts lần bị chuyển sang bảng dead_letter_orders
+    để không chặn các đơn xếp sau nó.
+    """
+
+    def __init__(self, sheet_instance, db_path: str, batch_size: int, flush_delay: float,
+                 max_backoff: float, max_attempts: int = OUTBOX_MAX_ATTEMPTS, on_flushed=None, on_dead_letter=None):
+        self.sheet = sheet_instance
+        self.batch_size = batch_size
+        self.flush_delay = flush_delay
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.on_flushed = on_flushed
+        self.on_dead_letter = on_dead_letter
+        self.last_error = ""
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pending_orders ("
+            " stt INTEGER PRIMARY KEY, row_index INTEGER NOT NULL, payload TEXT NOT NULL,"
+            " created_at REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS dead_letter_orders ("
+            " stt INTEGER PRIMARY KEY, row_index INTEGER NOT NULL, payload TEXT NOT NULL,"
+            " created_at REAL NOT NULL, attempts INTEGER NOT NULL, error TEXT NOT NULL, failed_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._worker = None
+
+    def start(self):
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name="order-outbox", daemon=True)
+            self._worker.start()
+
+    def enqueue(self, stt: int, row_index: int, update_data: list):
+        """Lưu đơn xuống đĩa rồi báo luồng nền; trả về ngay, không chờ Google Sheets."""
+        self.enqueue_many([(stt, row_index, update_data)])
+
+    def enqueue_many(self, orders: list):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO pending_orders (stt, row_index, payload, created_at) VALUES (?, ?, ?, ?)",
+                [(stt, row_index, json.dumps(update_data, ensure_ascii=False), time.time())
+                 for stt, row_index, update_data in orders],
+            )
+            self._conn.commit()
+        self._wakeup.set()
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pending_orders").fetchone()[0]
+
+    def dead_letter_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM dead_letter_orders").fetchone()[0]
+
+    def pending_counters(self) -> tuple:
+        """(STT lớn nhất, dòng lớn nhất) còn nằm trong hàng đợi, để bộ cấp phát không cấp trùng sau khi khởi động lại."""
+        with self._lock:
+            max_stt, max_row = self._conn.execute("SELECT MAX(stt), MAX(row_index) FROM pending_orders").fetchone()
+        return max_stt or 0, max_row or 0
+
+    def pending_stts(self) -> set:
+        with self._lock:
+            return {r[0] for r in self._conn.execute("SELECT stt FROM pending_orders")}
+
+    def _next_batch(self) -> list:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT stt, payload FROM pending_orders ORDER BY stt LIMIT ?", (self.batch_size,)
+            ).fetchall()
+
+    def flush_once(self) -> int:
+        """Gộp tối đa batch_size đơn đang chờ thành 1 lệnh batch_update.
+        Trả về số đơn đã rời hàng đợi (đã ghi, hoặc bị chuyển sang dead_letter_orders); 0 khi hàng đợi trống.
+
+        Lỗi tạm thời được ném ra ngay để luồng nền chờ rồi thử lại cả lô; nếu có đơn bị từ chối
+        thì vẫn ghi hết các đơn khác trong lô rồi mới ném lỗi của đơn đó.
+        """
+        batch = self._next_batch()
+        if not batch:
+            return 0
+        rejected = []
+        done = self._write_batch(batch, rejected)
+        if rejected:
+            raise rejected[-1]
+        return done
+
+    def _write_batch(self, batch: list, rejected: list) -> int:
+        update_data = []
+        for _, payload in batch:
+            update_data.extend(json.loads(payload))
+        try:
+            write_order_rows(self.sheet, update_data)
+        except Exception as e:
+            if is_retryable_error(e):
+                self._record_failure([stt for stt, _ in batch], e)
+                raise
+            if len(batch) == 1:
+                if self._record_failure([batch[0][0]], e, rejected=True):
+                    return 1
+                rejected.append(e)  # Còn lượt thử: báo luồng nền chờ rồi thử lại
+                return 0
+            # Chia đôi lô để khoanh vùng đơn lỗi, các nửa ghi được thì xóa khỏi hàng đợi ngay
+            mid = len(batch) // 2
+            return self._write_batch(batch[:mid], rejected) + self._write_batch(batch[mid:], rejected)
+        with self._lock:
+            self._conn.executemany("DELETE FROM pending_orders WHERE stt = ?", [(stt,) for stt, _ in batch])
+            self._conn.commit()
+        if self.on_flushed:
+            self.on_flushed([stt for stt, _ in batch])
+        return len(batch)
+
+    def _record_failure(self, stts: list, error: Exception, rejected: bool = False) -> list:
+        """Tăng số lần thử của đúng các đơn trong lô; đơn bị từ chối đủ max_attempts lần thì chuyển sang
+        dead_letter_orders. Trả về STT các đơn vừa bị chuyển."""
+        self.last_error = str(error)
+        params = [(stt,) for stt in stts]
+        with self._lock:
+            self._conn.executemany("UPDATE pending_orders SET attempts = attempts + 1 WHERE stt = ?", params)
+            dead = []
+            if rejected:
+                dead = [r[0] for r in self._conn.execute(
+                    f"SELECT stt FROM pending_orders WHERE attempts >= ? AND stt IN ({','.join('?' * len(stts))})",
+                    [self.max_attempts, *stts])]
+            if dead:
+                now = time.time()
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO dead_letter_orders"
+                    " SELECT stt, row_index, payload, created_at, attempts, ?, ? FROM pending_orders WHERE stt = ?",
+                    [(self.last_error, now, stt) for stt in dead])
+                self._conn.executemany("DELETE FROM pending_orders WHERE stt = ?", [(stt,) for stt in dead])
+            self._conn.commit()
+        if dead and self.on_dead_letter:
+            self.on_dead_letter(dead)
+        return dead
+
+    def _run(self):
+        attempt = 0
+        while True:
+            self._wakeup.wait(timeout=self.max_backoff)
+            self._wakeup.clear()
+            time.sleep(self.flush_delay)
+            while True:
+                try:
+                    if self.flush_once() == 0:
+                        break
+                    attempt = 0
+                    self.last_error = ""
+                except Exception as e:
+                    # Đơn lỗi vẫn nằm trong hàng đợi (số lần thử đã được ghi lại), chờ rồi thử lại
+                    base = 2.0 if is_quota_error(e) else 5.0
+                    time.sleep(backoff_delay(attempt, base=base, cap=self.max_backoff))
+                    attempt += 1
+
+
+def _after_flush(stts: list):
+    # Đơn đã lên sheet: đánh thức luồng làm mới nền để đọc lại snapshot & tồn kho ngay
+    get_stock_ledger().mark_flushed(stts, time.time())
+    get_snapshot_store().invalidate()
+
+
+def _after_dead_letter(stts: list):
+    # Đơn không bao giờ lên sheet: trả lại số hàng đã trừ trong sổ tồn kho
+    get_stock_ledger().discard(stts)
+
+
+@st.cache_resource
+def get_order_outbox(_sheet_instance, url) -> OrderOutbox:
+    outbox = OrderOutbox(
+        _sheet_instance,
+        db_path=OUTBOX_DB_PATH,
+        batch_size=OUTBOX_BATCH_SIZE,
+        flush_delay=OUTBOX_FLUSH_DELAY_SECONDS,
+        max_backoff=OUTBOX_MAX_BACKOFF_SECONDS,
+        on_flushed=_after_flush,
+        on_dead_letter=_after_dead_letter,
+    )
+    # Đơn còn tồn từ lần chạy trước chưa có trên sheet: đẩy bộ đếm STT/dòng vượt qua chúng
+    max_stt, max_row = outbox.pending_counters()
+    get_order_allocator().bump(max_stt + 1, max_row + 1)
+    OUTBOX_DEPTH.set_function(outbox.depth)
+    OUTBOX_DEAD_LETTERS.set_function(outbox.dead_letter_count)
+    outbox.start()
+    return outbox
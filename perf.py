@@ -0,0 +1,144 @@
+# perf.py
+import contextvars
+import functools
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from config import PERF_TRACE_HISTORY
+from sheets_gateway import get_sheets_gateway
+
+# Lượt chạy (rerun toàn trang hoặc rerun fragment) đang được đo của luồng script hiện tại
+_active_trace = contextvars.ContextVar("perf_trace", default=None)
+_log_lock = threading.Lock()
+_settings = {"log_path": ""}
+
+
+class RerunTrace:
+    """Các khoảng thời gian (span) đo được trong 1 lượt chạy script."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.started_at = time.time()
+        self.api_calls_before = get_sheets_gateway().api_calls()
+        self.api_calls = 0
+        self.total_ms = 0.0
+        self.spans = []  # (bắt đầu lúc ms, độ sâu, tên, ms)
+        self._start = time.perf_counter()
+        self._depth = 0
+
+    def finish(self):
+        self.total_ms = (time.perf_counter() - self._start) * 1000
+        # Bộ đếm của gateway là toàn tiến trình: gồm cả lệnh gọi của phiên khác/luồng nền chạy cùng lúc
+        self.api_calls = get_sheets_gateway().api_calls() - self.api_calls_before
+        self.spans.sort()
+
+    def to_dict(self) -> dict:
+        return {
+            "label": self.label, "started_at": self.started_at, "total_ms": round(self.total_ms, 2),
+            "api_calls": self.api_calls,
+            "spans": [{"name": n, "depth": d, "start_ms": round(s, 2), "ms": round(ms, 2)} for s, d, n, ms in self.spans],
+        }
+
+
+def configure(log_path: str = ""):
+    """Bật ghi log JSON-lines (mỗi lượt chạy 1 dòng) để phân tích offline; chuỗi rỗng = tắt."""
+    _settings["log_path"] = log_path
+
+
+@contextmanager
+def span(name: str):
+    """Đo 1 đoạn code; không làm gì khi không có lượt chạy nào đang được đo (VD: luồng nền outbox)."""
+    current = _active_trace.get()
+    if current is None:
+        yield
+        return
+    start = time.perf_counter()
+    depth = current._depth
+    current._depth += 1
+    try:
+        yield
+    finally:
+        current._depth -= 1
+        current.spans.append(((start - current._start) * 1000, depth, name, (time.perf_counter() - start) * 1000))
+
+
+def timed(name: str):
+    """Decorator của span() cho cả hàm."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def begin_rerun(label: str = "rerun") -> RerunTrace:
+    trace = RerunTrace(label)
+    _active_trace.set(trace)
+    return trace
+
+
+def end_rerun(trace: RerunTrace):
+    trace.finish()
+    _active_trace.set(None)
+    if get_script_run_ctx(suppress_warning=True) is not None:
+        if "_perf_traces" not in st.session_state:
+            st.session_state["_perf_traces"] = deque(maxlen=PERF_TRACE_HISTORY)
+        st.session_state["_perf_traces"].append(trace)
+    log_path = _settings["log_path"]
+    if log_path:
+        line = json.dumps(trace.to_dict(), ensure_ascii=False)
+        with _log_lock, open(log_path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+@contextmanager
+def trace(label: str):
+    """Dùng trong thân st.fragment: chạy cùng lượt toàn trang thì chỉ là 1 span,
+    khi fragment tự rerun thì thành 1 lượt đo riêng."""
+    if _active_trace.get() is not None:
+        with span(label):
+            yield
+        return
+    current = begin_rerun(label)
+    try:
+        yield
+    finally:
+        end_rerun(current)
+
+
+def traced(label: str):
+    """Decorator của trace() cho hàm fragment/dialog (đặt ngay dưới @st.fragment / @st.dialog)."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with trace(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def render_perf_panel():
+    """Bảng đo hiệu năng ẩn trong sidebar (bật bằng secret/biến môi trường PERF_PANEL)."""
+    with st.sidebar.expander("⏱️ Hiệu năng (dev)"):
+        history = list(st.session_state.get("_perf_traces", []))
+        if not history:
+            st.caption("Chưa có lượt chạy nào được đo.")
+        for item in reversed(history[-5:]):
+            st.markdown(f"**{item.label}** · {item.total_ms:,.0f} ms · {item.api_calls} lệnh gọi API")
+            if item.spans:
+                st.dataframe(pd.DataFrame(
+                    [(" " * d + n, round(ms, 1)) for _, d, n, ms in item.spans], columns=["Bước", "ms"]
+                ), hide_index=True, use_container_width=True)
+        stats = get_sheets_gateway().stats()
+        st.markdown(f"**Lệnh gọi Sheets API từ lúc khởi động:** {sum(v for k, v in stats.items() if k != 'coalesced')}")
+        if stats:
+            st.dataframe(pd.DataFrame(sorted(stats.items()), columns=["Lệnh", "Số lần"]), hide_index=True, use_container_width=True)
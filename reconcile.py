@@ -0,0 +1,191 @@
+# reconcile.py
+import io
+import re
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+
+import pandas as pd
+
+from config import (
+    COT_STT, COT_TEN_TNV, TONG_TIEN_CAN_TRA, DA_THANH_TOAN,
+    BANK_MEMO_COLUMNS, BANK_AMOUNT_COLUMNS, RECONCILE_NAME_SIMILARITY
+)
+from util import convert_name, normalize_key
+
+# Nội dung QR do app sinh: "BANHANGF18 DON{stt} {TÊN TNV KHÔNG DẤU}". Sau convert_name mọi khoảng trắng bị bỏ,
+# nên "DON 12", "don12", "D0N12" đều thành DON12/D0N12; phần chữ ngay sau số là tên TNV (có thể bị ngân hàng cắt bớt)
+_MEMO_STT = re.compile(r"D[O0]N(\d{1,6})([A-Z]*)")
+_MEMO_PREFIX = re.compile(r"BANHANG\w*?F18")
+_NEGATIVE_AMOUNT = re.compile(r"^\D*-|-\D*$|^\s*\(.*\)\s*$")
+
+MATCHED = "Khớp"
+MATCHED_BY_NAME = "Khớp theo tên TNV (cần kiểm tra)"
+NAME_MISMATCH = "Sai tên TNV (cần kiểm tra)"
+AMOUNT_MISMATCH = "Lệch số tiền"
+ALREADY_PAID = "Đã ghi nhận trước đó"
+DUPLICATE = "Trùng giao dịch"
+UNMATCHED = "Không tìm thấy đơn"
+
+
+@dataclass
+class BankTransaction:
+    line: int
+    memo: str
+    amount: int
+    stt: int = None          # STT đọc được từ nội dung chuyển khoản
+    name_key: str = ""       # Phần tên TNV (đã bỏ dấu, viết liền) ngay sau STT
+
+
+@dataclass
+class ReconcileResult:
+    transaction: BankTransaction
+    status: str
+    stt: int = None          # Đơn được khớp (có thể khác STT trong nội dung nếu khớp theo tên)
+    expected: int = None     # TỔNG TIỀN CẦN TRẢ của đơn
+    volunteer: str = ""
+
+    @property
+    def confirmed(self) -> bool:
+        """Chỉ giao dịch khớp chắc chắn (STT + tên TNV + số tiền) được tự đánh dấu ghi nhận."""
+        return self.status == MATCHED
+
+
+def parse_amount(value) -> int:
+    """'150,000' / '150.000' / '+150,000.00 VND' -> 150000; '-150,000' / '(150.000)' (tiền ra) -> -150000; không đọc được -> 0."""
+    raw = str(value)
+    text = re.sub(r"[^\d.,]", "", raw)
+    text = re.sub(r"[.,]\d{1,2}$", "", text) if not re.fullmatch(r"\d{1,3}([.,]\d{3})+", text) else text
+    digits = re.sub(r"[.,]", "", text)
+    amount = int(digits) if digits else 0
+    # Chỉ dấu trừ đứng trước/sau con số hoặc cả số nằm trong ngoặc (kiểu kế toán) là tiền ra;
+    # gạch nối giữa các chữ số (ngày '2024-01-05', mã giao dịch...) không phải dấu âm
+    return -amount if _NEGATIVE_AMOUNT.search(raw) else amount
+
+
+def parse_memo(memo: str) -> tuple:
+    """(STT, phần tên TNV) trong nội dung chuyển khoản; STT None nếu không có cụm DON{số}."""
+    key = convert_name(memo)
+    prefix = _MEMO_PREFIX.search(key)
+    # Ưu tiên cụm DON{số} đứng sau tiền tố BANHANG...F18 (nội dung ngân hàng thường có thêm mã giao dịch phía trước)
+    match = _MEMO_STT.search(key, prefix.end() if prefix else 0) or _MEMO_STT.search(key)
+    if match is None:
+        # Mất cụm DON{số}: phần sau tiền tố (nếu có) coi như tên TNV để thử khớp theo tên
+        return None, key[prefix.end():] if prefix else ""
+    return int(match.group(1)), match.group(2)
+
+
+def _find_column(columns, candidates) -> str:
+    keys = {normalize_key(c): c for c in columns}
+    for candidate in candidates:
+        if candidate in keys:
+            return keys[candidate]
+    for candidate in candidates:
+        for key, column in keys.items():
+            if candidate in key:
+                return column
+    return None
+
+
+def read_bank_statement(file_name: str, data: bytes) -> list:
+    """Đọc sao kê CSV/Excel, tự nhận cột nội dung & cột số tiền theo tên (BANK_MEMO_COLUMNS, BANK_AMOUNT_COLUMNS)."""
+    if file_name.lower().endswith((".xlsx", ".xls")):
+        df = pd.read_excel(io.BytesIO(data), dtype=str)
+    else:
+        df = pd.read_csv(io.BytesIO(data), dtype=str, encoding="utf-8-sig", sep=None, engine="python", keep_default_na=False)
+    df = df.fillna("")
+    memo_col = _find_column(df.columns, BANK_MEMO_COLUMNS)
+    amount_col = _find_column(df.columns, BANK_AMOUNT_COLUMNS)
+    if memo_col is None or amount_col is None:
+        raise ValueError("Không tìm thấy cột nội dung chuyển khoản hoặc cột số tiền trong sao kê.")
+
+    transactions = []
+    for pos, (memo, amount) in enumerate(zip(df[memo_col].tolist(), df[amount_col].tolist())):
+        if not str(memo).strip():
+            continue
+        amount = parse_amount(amount)
+        if amount <= 0:
+            continue  # Giao dịch tiền ra (ghi nợ) hoặc không có số tiền: không phải khách thanh toán đơn
+        stt, name_key = parse_memo(memo)
+        transactions.append(BankTransaction(line=pos + 2, memo=str(memo), amount=amount, stt=stt, name_key=name_key))
+    return transactions
+
+
+def name_matches(memo_name: str, volunteer_key: str, threshold: float = RECONCILE_NAME_SIMILARITY) -> bool:
+    """Tên trong nội dung có thể bị cắt bớt (tiền tố) hoặc gõ sai vài ký tự."""
+    if not memo_name or not volunteer_key:
+        return False
+    if volunteer_key.startswith(memo_name) or memo_name.startswith(volunteer_key):
+        return True
+    # So phần đầu cùng độ dài: đuôi nội dung thường dính thêm mã giao dịch của ngân hàng
+    head = memo_name[:len(volunteer_key)]
+    return SequenceMatcher(None, head, volunteer_key).ratio() >= threshold
+
+
+class PaymentIndex:
+    """Chỉ mục đối soát dựng 1 lần từ bảng đơn hàng: băm STT -> đơn, và tên TNV (không dấu) -> đơn chưa thanh toán.
+
+    Giao dịch có STT tra cứu O(1); chỉ giao dịch không khớp STT mới rơi xuống nhánh so tên gần đúng,
+    và nhánh này chỉ so với các TNV có cùng 2 ký tự đầu tên.
+    """
+
+    def __init__(self, order_table):
+        df = order_table.df
+        self._orders = {}
+        self._by_volunteer = {}
+        if COT_STT not in df.columns:
+            return
+        volunteers = df[COT_TEN_TNV].astype(str) if COT_TEN_TNV in df.columns else pd.Series("", index=df.index)
+        keys = volunteers.map({v: convert_name(v) if v.strip() else "" for v in volunteers.unique()})
+        totals = df[TONG_TIEN_CAN_TRA] if TONG_TIEN_CAN_TRA in df.columns else pd.Series(0, index=df.index)
+        paid = df[DA_THANH_TOAN] if DA_THANH_TOAN in df.columns else pd.Series(False, index=df.index)
+        for stt, volunteer, key, total, is_paid in zip(df[COT_STT].tolist(), volunteers, keys, totals.tolist(), paid.tolist()):
+            if stt is pd.NA or int(stt) in self._orders:
+                continue
+            self._orders[int(stt)] = (volunteer, key, int(total), bool(is_paid))
+            if key and not is_paid:
+                self._by_volunteer.setdefault(key[:2], {}).setdefault(key, []).append(int(stt))
+
+    def _match_by_name(self, tx: BankTransaction, taken: set):
+        """STT duy nhất chưa thanh toán của TNV trùng tên có đúng số tiền, None nếu không có/không chắc."""
+        if len(tx.name_key) < 4:
+            return None  # Tên bị cắt quá ngắn, khớp theo tiền tố dễ nhầm người
+        candidates = []
+        for key, stts in self._by_volunteer.get(tx.name_key[:2], {}).items():
+            if name_matches(tx.name_key, key):
+                candidates += [stt for stt in stts if stt not in taken and self._orders[stt][2] == tx.amount]
+        return candidates[0] if len(candidates) == 1 else None
+
+    def reconcile(self, transactions: list) -> list:
+        results, taken = [], set()
+        for tx in transactions:
+            order = self._orders.get(tx.stt) if tx.stt is not None else None
+            if order is not None and (not tx.name_key or name_matches(tx.name_key, order[1])):
+                volunteer, _, expected, is_paid = order
+                if is_paid:
+                    status = ALREADY_PAID
+                elif tx.stt in taken:
+                    status = DUPLICATE
+                elif tx.amount != expected:
+                    status = AMOUNT_MISMATCH
+                else:
+                    status = MATCHED
+                    taken.add(tx.stt)
+                results.append(ReconcileResult(tx, status, tx.stt, expected, volunteer))
+                continue
+
+            # STT gõ sai/mất: thử tìm theo tên TNV + số tiền trong các đơn chưa thanh toán
+            stt = self._match_by_name(tx, taken) if tx.name_key else None
+            if stt is not None:
+                volunteer, _, expected, _ = self._orders[stt]
+                taken.add(stt)
+                results.append(ReconcileResult(tx, MATCHED_BY_NAME, stt, expected, volunteer))
+            elif order is not None:
+                # Có STT nhưng tên không khớp và không đoán được đơn khác: để người đối soát quyết định
+                volunteer, _, expected, is_paid = order
+                status = ALREADY_PAID if is_paid else (AMOUNT_MISMATCH if tx.amount != expected else NAME_MISMATCH)
+                if status == NAME_MISMATCH:
+                    taken.add(tx.stt)
+                results.append(ReconcileResult(tx, status, tx.stt, expected, volunteer))
+            else:
+                results.append(ReconcileResult(tx, UNMATCHED))
+        return results
@@ -0,0 +1,108 @@
+# refresher.py
+import threading
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import streamlit as st
+
+from config import (
+    REFRESH_INTERVAL_SECONDS, SALE_REFRESH_INTERVAL_SECONDS, SALE_TIMEZONE, SALE_WINDOWS,
+    HANG_TON_NAME_START, HANG_TON_NAME_END, HANG_TON_VALUE_START, HANG_TON_VALUE_END
+)
+from util import get_stock_data, get_stock, backoff_delay
+from sheet_store import get_snapshot_store
+from stock_ledger import get_stock_ledger
+from snapshot_cache import get_snapshot_persister
+
+
+def in_sale_window(now: datetime, windows) -> bool:
+    """Giờ hiện tại có nằm trong một khung ("HH:MM", "HH:MM") nào không (hỗ trợ khung qua nửa đêm)."""
+    current = now.strftime("%H:%M")
+    for start, end in windows:
+        if start <= end and start <= current < end:
+            return True
+        if start > end and (current >= start or current < end):
+            return True
+    return False
+
+
+class DataRefresher:
+    """Luồng nền giữ snapshot sheet đơn hàng (kèm bảng giá) và số tồn kho luôn mới.
+
+    Lượt rerun chỉ đọc bản mới nhất đang có trong bộ nhớ, không phải chờ Google Sheets.
+    Chu kỳ làm mới nhanh hơn trong khung giờ mở bán; invalidate() của snapshot store
+    (VD: outbox vừa đẩy đơn lên sheet) đánh thức luồng ngay thay vì chờ hết chu kỳ.
+    """
+
+    def __init__(self, sheet, stock_sheet, snapshot_store, stock_ledger, persister,
+                 interval: float, sale_interval: float, sale_windows, timezone: str):
+        self.sheet = sheet
+        self.stock_sheet = stock_sheet
+        self.snapshot_store = snapshot_store
+        self.stock_ledger = stock_ledger
+        self.persister = persister
+        self.interval = interval
+        self.sale_interval = sale_interval
+        self.sale_windows = sale_windows
+        self.tz = ZoneInfo(timezone)
+        self._stock_lock = threading.Lock()
+
+    def current_interval(self) -> float:
+        if in_sale_window(datetime.now(self.tz), self.sale_windows):
+            return self.sale_interval
+        return self.interval
+
+    def refresh_stock(self, max_age: float = 0.0):
+        """Đọc sheet "Quản lí tồn" rồi nạp vào sổ tồn kho; bỏ qua nếu số tồn mới hơn max_age giây."""
+        with self._stock_lock:
+            age = self.stock_ledger.age
+            if age is not None and not self.stock_ledger.from_disk and age < max_age:
+                return
+            fetched_at = time.time()
+            headers_ton, values_ton = get_stock_data(
+                self.stock_sheet, f"{HANG_TON_NAME_START}:{HANG_TON_NAME_END}",
+                f"{HANG_TON_VALUE_START}:{HANG_TON_VALUE_END}")
+            stock_map = get_stock(headers_ton=headers_ton, values_ton=values_ton)
+            self.stock_ledger.seed(stock_map, fetched_at)
+            self.persister.save_stock(stock_map, fetched_at)
+
+    def refresh_all(self):
+        # Bỏ qua phần vừa được tải gần đây (VD: lượt rerun đầu tiên lúc khởi động đã tải rồi)
+        max_age = self.current_interval() / 2
+        self.snapshot_store.refresh(self.sheet, max_age=max_age)
+        self.refresh_stock(max_age=max_age)
+
+    def start(self):
+        self.snapshot_store.refreshed_in_background = True
+        threading.Thread(target=self._run, name="data-refresher", daemon=True).start()
+
+    def _run(self):
+        failures = 0
+        while True:
+            self.snapshot_store.changed.clear()
+            try:
+                self.refresh_all()
+                failures = 0
+                wait = self.current_interval()
+            except Exception as e:
+                failures += 1
+                wait = max(self.current_interval(), backoff_delay(failures, cap=120.0))
+                print(f"Làm mới dữ liệu nền thất bại, thử lại sau {wait:.0f}s: {e}")
+            self.snapshot_store.changed.wait(wait)
+
+
+@st.cache_resource
+def get_data_refresher(_sheet_instance, _stock_sheet_instance, url) -> DataRefresher:
+    refresher = DataRefresher(
+        _sheet_instance, _stock_sheet_instance,
+        snapshot_store=get_snapshot_store(),
+        stock_ledger=get_stock_ledger(),
+        persister=get_snapshot_persister(),
+        interval=REFRESH_INTERVAL_SECONDS,
+        sale_interval=SALE_REFRESH_INTERVAL_SECONDS,
+        sale_windows=SALE_WINDOWS,
+        timezone=SALE_TIMEZONE,
+    )
+    refresher.start()
+    return refresher
@@ -0,0 +1,83 @@
+# sales_aggregates.py
+import threading
+
+import streamlit as st
+
+from config import GIA_ROW_NAME, TIEN_BAN_HANG, COT_TEN_TNV
+
+
+class SalesAggregates:
+    """Số liệu tổng hợp cho trang dashboard: tổng doanh số, doanh số theo TNV, số lượng theo mặt hàng."""
+
+    def __init__(self, version: int, total_sales: int, revenue_by_tnv: dict, qty_by_sku: dict):
+        self.version = version
+        self.total_sales = total_sales
+        self.revenue_by_tnv = revenue_by_tnv
+        self.qty_by_sku = qty_by_sku
+
+
+def _merge(target: dict, delta: dict, sign: int):
+    for key, value in delta.items():
+        target[key] = target.get(key, 0) + sign * value
+        if target[key] == 0:
+            del target[key]
+
+
+def _partial_sums(df, product_columns) -> tuple:
+    if df.empty:
+        return 0, {}, {}
+    revenue = df[TIEN_BAN_HANG]
+    by_tnv = revenue.groupby(df[COT_TEN_TNV]).sum()
+    return (
+        int(revenue.sum()),
+        {k: int(v) for k, v in by_tnv.items() if v},
+        {k: int(v) for k, v in df[product_columns].sum().items() if v},
+    )
+
+
+class AggregateStore:
+    """Giữ số liệu tổng hợp theo phiên bản snapshot, chỉ cộng/trừ phần dòng thay đổi kể từ lần tính trước.
+
+    Với delta sync, phần thay đổi chỉ là đuôi sheet (đơn mới + cửa sổ kiểm tra) nên chi phí cập nhật
+    không phụ thuộc tổng số đơn. Khi có lần tải lại toàn bộ hoặc đổi cấu trúc cột thì mới tính lại từ đầu.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._aggregates = None
+        self._table = None
+
+    def get(self, order_table, snapshot_store) -> SalesAggregates:
+        with self._lock:
+            current, prev_table = self._aggregates, self._table
+            if current is not None and current.version == order_table.version:
+                return current
+            if current is not None and order_table.version < current.version:
+                # Phiên đang giữ snapshot cũ hơn: tính riêng, không ghi đè số liệu mới hơn trong kho
+                return SalesAggregates(order_table.version, *_partial_sums(order_table.df, order_table.product_columns))
+
+            changed_from = None
+            if current is not None and list(prev_table.df.columns) == list(order_table.df.columns):
+                changed_from = snapshot_store.changed_between(current.version, order_table.version)
+
+            if changed_from is None:
+                total, by_tnv, by_sku = _partial_sums(order_table.df, order_table.product_columns)
+            else:
+                start = max(0, changed_from - (GIA_ROW_NAME + 1))
+                total, by_tnv, by_sku = current.total_sales, dict(current.revenue_by_tnv), dict(current.qty_by_sku)
+                old_total, old_tnv, old_sku = _partial_sums(prev_table.df.iloc[start:], prev_table.product_columns)
+                new_total, new_tnv, new_sku = _partial_sums(order_table.df.iloc[start:], order_table.product_columns)
+                total += new_total - old_total
+                _merge(by_tnv, old_tnv, -1)
+                _merge(by_tnv, new_tnv, 1)
+                _merge(by_sku, old_sku, -1)
+                _merge(by_sku, new_sku, 1)
+
+            self._aggregates = SalesAggregates(order_table.version, total, by_tnv, by_sku)
+            self._table = order_table
+            return self._aggregates
+
+
+@st.cache_resource
+def get_aggregate_store() -> AggregateStore:
+    return AggregateStore()
@@ -0,0 +1,229 @@
+# sheet_store.py
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+import streamlit as st
+from gspread.utils import rowcol_to_a1
+
+from config import GIA_ROW_NAME, SNAPSHOT_TTL_SECONDS, DELTA_VERIFY_ROWS, FULL_SYNC_INTERVAL_SECONDS
+from util import get_sheet_values, get_sheet_range
+from metrics import CACHE_REQUESTS, CACHE_MISSES, SNAPSHOT_AGE_SECONDS
+from snapshot_cache import get_snapshot_persister
+
+
+@dataclass(frozen=True)
+class SheetSnapshot:
+    """Bản chụp bất biến của sheet đơn hàng, dùng chung cho tất cả các phiên truy cập."""
+    version: int
+    rows: tuple
+    fetched_at: float
+    # Phiên bản liền trước và chỉ số dòng đầu tiên có thể khác so với phiên bản đó (0 = tải lại toàn bộ)
+    parent_version: int = 0
+    changed_from: int = 0
+    # Nạp từ file lưu trên đĩa lúc khởi động (chưa đối chiếu với Google Sheets)
+    from_disk: bool = False
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+
+def _last_order_row(rows: tuple) -> int:
+    """Số dòng (tính từ 1) của dòng cuối cùng có Tên TNV bán ở cột B, chỉ có tiêu đề thì trả về dòng tiêu đề."""
+    for idx in range(len(rows) - 1, GIA_ROW_NAME, -1):
+        row = rows[idx]
+        if len(row) > 1 and str(row[1]).strip():
+            return idx + 1
+    return GIA_ROW_NAME + 1
+
+
+def _pad_rows(raw_rows, width: int) -> tuple:
+    return tuple(tuple(r) + ("",) * (width - len(r)) for r in raw_rows)
+
+
+class SnapshotStore:
+    """Kho snapshot toàn tiến trình: mỗi chu kỳ TTL chỉ gọi Google Sheets đúng 1 lần.
+
+    Sau lần tải đầu, các lần làm mới chỉ đọc phần đuôi sheet (delta) rồi ghép vào snapshot cũ,
+    định kỳ FULL_SYNC_INTERVAL_SECONDS mới tải lại toàn bộ để đối soát.
+    """
+
+    def __init__(self, ttl: float, verify_rows: int, full_sync_interval: float):
+        self.ttl = ttl
+        self.verify_rows = verify_rows
+        self.full_sync_interval = full_sync_interval
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._last_full_sync = 0.0
+        # Lịch sử ngắn (phiên bản, phiên bản cha, dòng thay đổi đầu tiên) cho các bộ tổng hợp tăng dần
+        self._history = deque(maxlen=256)
+        # Đếm số lần yêu cầu làm mới, tránh mất lệnh invalidate phát sinh giữa lúc đang tải
+        self._dirty_seq = 0
+        self._clean_seq = 0
+        # Gọi sau mỗi lần tải xong từ Sheets (VD: lưu snapshot xuống đĩa)
+        self.on_refresh = None
+        self._background_refresh = threading.Lock()
+        # Bật khi có luồng làm mới nền (refresher.py): get() trả ngay bản đang có thay vì chờ tải lại
+        self.refreshed_in_background = False
+        # Được set mỗi lần invalidate() để đánh thức luồng làm mới nền
+        self.changed = threading.Event()
+
+    def _is_fresh(self, snap) -> bool:
+        return (snap is not None and not snap.from_disk
+                and self._dirty_seq == self._clean_seq and snap.age < self.ttl)
+
+    def seed(self, rows: tuple, fetched_at: float):
+        """Nạp snapshot đã lưu trên đĩa: các phiên hiển thị được ngay, lần get() đầu tiên sẽ tải toàn bộ ở luồng nền."""
+        with self._lock:
+            if self._snapshot is None and rows:
+                self._snapshot = SheetSnapshot(version=1, rows=rows, fetched_at=fetched_at, from_disk=True)
+                self._history.append((1, 0, 0))
+
+    def get(self, sheet_instance, wait_for_sheet: bool = False) -> SheetSnapshot:
+        """Snapshot dùng chung. wait_for_sheet=True (cấp STT/ghi đơn) không chấp nhận bản nạp từ đĩa
+        hay bản cũ hơn lần ghi đơn gần nhất."""
+        CACHE_REQUESTS.inc(cache="snapshot")
+        snap = self._snapshot
+        if self._is_fresh(snap):
+            return snap
+        if snap is not None and not wait_for_sheet:
+            if snap.from_disk:
+                if not self.refreshed_in_background:
+                    self._refresh_in_background(sheet_instance)
+                return snap
+            if self.refreshed_in_background and snap.age < self.ttl:
+                # Luồng nền đã được invalidate() đánh thức: hiển thị bản hiện có trong lúc chờ
+                return snap
+        with self._lock:
+            # Kiểm tra lại sau khi giữ khóa: một phiên khác có thể vừa tải xong
+            snap = self._snapshot
+            if self._is_fresh(snap):
+                return snap
+            return self._refresh(sheet_instance)
+
+    def _refresh_in_background(self, sheet_instance):
+        if not self._background_refresh.acquire(blocking=False):
+            return  # Đã có luồng đang tải
+
+        def run():
+            try:
+                with self._lock:
+                    if not self._is_fresh(self._snapshot):
+                        self._refresh(sheet_instance)
+            except Exception as e:
+                print(f"Tải snapshot nền thất bại, sẽ thử lại ở lượt sau: {e}")
+            finally:
+                self._background_refresh.release()
+
+        threading.Thread(target=run, name="snapshot-warmup", daemon=True).start()
+
+    def changed_between(self, old_version: int, new_version: int):
+        """Chỉ số dòng nhỏ nhất có thể đã đổi giữa hai phiên bản; None nếu có lần tải lại toàn bộ hoặc hết lịch sử."""
+        changed_from = None
+        for entry_version, parent_version, entry_changed_from in reversed(list(self._history)):
+            if entry_version > new_version:
+                continue
+            if entry_changed_from == 0:
+                return None
+            changed_from = entry_changed_from if changed_from is None else min(changed_from, entry_changed_from)
+            if parent_version == old_version:
+                return changed_from
+        return None
+
+    def invalidate(self):
+        """Đánh dấu snapshot hết hạn (gọi ngay sau khi ghi đơn) để lần đọc kế tiếp tải lại."""
+        self._dirty_seq += 1
+        self.changed.set()
+
+    def refresh(self, sheet_instance, max_age: float = 0.0) -> SheetSnapshot:
+        """Tải lại (delta hoặc toàn bộ) bất kể TTL, dùng cho luồng làm mới nền;
+        bỏ qua nếu bản hiện có chưa bị invalidate và mới hơn max_age giây."""
+        with self._lock:
+            snap = self._snapshot
+            if self._is_fresh(snap) and snap.age < max_age:
+                return snap
+            return self._refresh(sheet_instance)
+
+    def patch(self, cells: dict):
+        """Cập nhật lạc quan: áp ngay các ô vừa ghi thành công lên Sheets vào snapshot thành 1 phiên bản mới,
+        không cần tải lại. cells: {(chỉ số dòng, chỉ số cột) 0-based: giá trị dạng chuỗi như trên sheet}."""
+        with self._lock:
+            prev = self._snapshot
+            cells = {(r, c): v for (r, c), v in cells.items() if prev is not None and r < len(prev.rows)}
+            if not cells:
+                return prev
+            rows = list(prev.rows)
+            for (r, c), value in cells.items():
+                row = list(rows[r])
+                row += [""] * (c + 1 - len(row))
+                row[c] = value
+                rows[r] = tuple(row)
+            changed_from = min(r for r, _ in cells)
+            # Giữ fetched_at cũ: các dòng khác vẫn là dữ liệu của lần đọc trước
+            self._snapshot = SheetSnapshot(
+                version=prev.version + 1, rows=tuple(rows), fetched_at=prev.fetched_at,
+                parent_version=prev.version, changed_from=changed_from, from_disk=prev.from_disk,
+            )
+            self._history.append((self._snapshot.version, prev.version, changed_from))
+            return self._snapshot
+
+    def age(self):
+        """Tuổi (giây) snapshot hiện tại, None khi chưa tải lần nào."""
+        snap = self._snapshot
+        return snap.age if snap is not None else None
+
+    def _refresh(self, sheet_instance) -> SheetSnapshot:
+        CACHE_MISSES.inc(cache="snapshot")
+        requested_seq = self._dirty_seq
+        prev = self._snapshot
+        now = time.time()
+
+        if prev is None or len(prev.rows) <= GIA_ROW_NAME or now - self._last_full_sync >= self.full_sync_interval:
+            rows = tuple(tuple(r) for r in get_sheet_values(sheet_instance))
+            changed_from = 0
+            self._last_full_sync = now
+        else:
+            rows, changed_from = self._delta_rows(sheet_instance, prev.rows)
+
+        self._snapshot = SheetSnapshot(
+            version=prev.version + 1 if prev else 1,
+            rows=rows,
+            fetched_at=now,
+            parent_version=prev.version if prev else 0,
+            changed_from=changed_from,
+        )
+        self._history.append((self._snapshot.version, self._snapshot.parent_version, changed_from))
+        self._clean_seq = requested_seq
+        if self.on_refresh is not None:
+            self.on_refresh(self._snapshot)
+        return self._snapshot
+
+    def _delta_rows(self, sheet_instance, old_rows: tuple):
+        """Chỉ đọc các dòng mới phát sinh cộng thêm một cửa sổ dòng cuối để kiểm tra sửa đổi."""
+        width = len(old_rows[GIA_ROW_NAME])
+        # Neo cửa sổ vào dòng đơn cuối cùng (cột B - Tên TNV bán có dữ liệu) như scan_order_counters, không phải
+        # len(old_rows): sheet thật có sẵn nhiều dòng chỉ chứa checkbox FALSE ở cuối, đơn mới được ghi vào giữa chúng
+        anchor = _last_order_row(old_rows)
+        start = max(GIA_ROW_NAME + 1, min(anchor, len(old_rows)) - self.verify_rows)
+        end_col = rowcol_to_a1(1, width).rstrip("0123456789")
+        tail = get_sheet_range(sheet_instance, f"A{start + 1}:{end_col}")
+        return old_rows[:start] + _pad_rows(tail, width), start
+
+
+@st.cache_resource
+def get_snapshot_store() -> SnapshotStore:
+    store = SnapshotStore(
+        ttl=SNAPSHOT_TTL_SECONDS,
+        verify_rows=DELTA_VERIFY_ROWS,
+        full_sync_interval=FULL_SYNC_INTERVAL_SECONDS,
+    )
+    SNAPSHOT_AGE_SECONDS.set_function(store.age)
+    # Khởi động nhanh: dùng ngay snapshot lưu trên đĩa từ lần chạy trước, sau mỗi lần tải lại thì lưu bản mới
+    persister = get_snapshot_persister()
+    persisted = persister.load_snapshot()
+    if persisted is not None:
+        store.seed(*persisted)
+    store.on_refresh = persister.save_snapshot
+    return store
@@ -0,0 +1,167 @@
+# sheets_gateway.py
+import threading
+import time
+from collections import Counter
+
+import streamlit as st
+
+from config import SHEETS_RATE_PER_MINUTE, SHEETS_BURST
+from metrics import SHEETS_API_CALLS, SHEETS_API_ERRORS, SHEETS_COALESCED_READS
+
+READ_METHODS = {"get_all_values", "get", "batch_get", "col_values", "row_values", "acell", "cell"}
+WRITE_METHODS = {"batch_update", "update", "update_cell", "update_acell", "append_row", "append_rows"}
+
+
+class TokenBucket:
+    """Bộ giới hạn tốc độ kiểu token bucket dùng chung cho mọi phiên trong tiến trình."""
+
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst)
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Gộp các lệnh đọc giống hệt nhau đang chạy song song thành 1 request duy nhất.
+
+    Kết quả được chia sẻ cho tất cả các phiên đang chờ, nên nơi gọi không được sửa trực tiếp kết quả.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _InFlight()
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class SheetsGateway:
+    """Cửa ngõ duy nhất ra Google Sheets: mọi lệnh gọi đều qua token bucket, lệnh đọc được gộp single-flight."""
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self.flights = SingleFlight()
+        # Đếm lệnh gọi thật theo tên hàm gspread, "coalesced" = lệnh đọc được gộp vào request đang chạy
+        self._stats = Counter()
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self._stats[name] += 1
+        if name == "coalesced":
+            SHEETS_COALESCED_READS.inc()
+        else:
+            SHEETS_API_CALLS.inc(method=name)
+
+    def call(self, fn, *args, **kwargs):
+        self.bucket.acquire()
+        name = getattr(fn, "__name__", "call")
+        self._count(name)
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            # gspread APIError có thuộc tính code (429 = hết hạn ngạch); lỗi mạng ghi theo tên lớp lỗi
+            SHEETS_API_ERRORS.inc(method=name, status=getattr(e, "code", None) or type(e).__name__)
+            raise
+
+    def read(self, key, fn, *args, **kwargs):
+        led = []
+        result = self.flights.do(key, lambda: led.append(True) or self.call(fn, *args, **kwargs))
+        if not led:
+            self._count("coalesced")
+        return result
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def api_calls(self) -> int:
+        with self._stats_lock:
+            return sum(v for k, v in self._stats.items() if k != "coalesced")
+
+
+class GuardedWorksheet:
+    """Bọc gspread.Worksheet: các phương thức đọc/ghi mạng được định tuyến qua SheetsGateway."""
+
+    def __init__(self, worksheet, gateway: SheetsGateway):
+        self._worksheet = worksheet
+        self._gateway = gateway
+
+    def __getattr__(self, name):
+        attr = getattr(self._worksheet, name)
+        if name in READ_METHODS:
+            def guarded_read(*args, **kwargs):
+                key = (self._worksheet.id, name, repr(args), repr(sorted(kwargs.items())))
+                return self._gateway.read(key, attr, *args, **kwargs)
+            return guarded_read
+        if name in WRITE_METHODS:
+            def guarded_write(*args, **kwargs):
+                return self._gateway.call(attr, *args, **kwargs)
+            return guarded_write
+        return attr
+
+
+class GuardedSpreadsheet:
+    """Bọc gspread.Spreadsheet để các worksheet trả về cũng đi qua SheetsGateway."""
+
+    def __init__(self, spreadsheet, gateway: SheetsGateway):
+        self._spreadsheet = spreadsheet
+        self._gateway = gateway
+
+    @property
+    def sheet1(self) -> GuardedWorksheet:
+        return self.get_worksheet(0)
+
+    def get_worksheet(self, index: int) -> GuardedWorksheet:
+        return GuardedWorksheet(self._gateway.call(self._spreadsheet.get_worksheet, index), self._gateway)
+
+    def worksheet(self, title: str) -> GuardedWorksheet:
+        return GuardedWorksheet(self._gateway.call(self._spreadsheet.worksheet, title), self._gateway)
+
+    def __getattr__(self, name):
+        return getattr(self._spreadsheet, name)
+
+
+@st.cache_resource
+def get_sheets_gateway() -> SheetsGateway:
+    return SheetsGateway(TokenBucket(rate_per_minute=SHEETS_RATE_PER_MINUTE, burst=SHEETS_BURST))
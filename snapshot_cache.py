@@ -0,0 +1,150 @@
+# snapshot_cache.py
+import json
+import os
+import threading
+import time
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import streamlit as st
+
+from config import SNAPSHOT_CACHE_DIR, SNAPSHOT_PERSIST_INTERVAL_SECONDS
+
+ORDERS_FILE = "orders.parquet"
+STOCK_FILE = "stock.parquet"
+
+
+def _ignore_in_git(directory: str):
+    """File Parquet chứa dữ liệu khách hàng: thư mục tự kèm .gitignore để không bị commit dù đặt ở đâu trong repo."""
+    marker = os.path.join(directory, ".gitignore")
+    if not os.path.exists(marker):
+        with open(marker, "w", encoding="utf-8") as f:
+            f.write("*\n")
+
+
+def _write_table(path: str, table: pa.Table, meta: dict):
+    """Ghi nguyên tử (file tạm + rename): tiến trình bị tắt giữa chừng không để lại file hỏng."""
+    table = table.replace_schema_metadata({"oliu": json.dumps(meta, ensure_ascii=False)})
+    tmp_path = f"{path}.tmp"
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _read_table(path: str):
+    if not os.path.exists(path):
+        return None, None
+    table = pq.read_table(path)
+    meta = json.loads((table.schema.metadata or {}).get(b"oliu", b"{}"))
+    return table, meta
+
+
+def rows_to_table(rows) -> pa.Table:
+    """Lưu nguyên dạng chuỗi của sheet theo cột (c0, c1, ...), dòng ngắn được đệm chuỗi rỗng."""
+    width = max((len(r) for r in rows), default=0)
+    return pa.table({
+        f"c{i}": pa.array([r[i] if i < len(r) else "" for r in rows], type=pa.string())
+        for i in range(width)
+    })
+
+
+def table_to_rows(table: pa.Table) -> tuple:
+    columns = [table.column(i).to_pylist() for i in range(table.num_columns)]
+    return tuple(zip(*columns)) if columns else ()
+
+
+class SnapshotPersister:
+    """Lưu snapshot sheet đơn hàng & số tồn kho xuống đĩa (Parquet) để khởi động lại có dữ liệu ngay.
+
+    Việc ghi chạy ở luồng nền, chỉ giữ bản mới nhất và ghi sheet đơn hàng tối đa 1 lần mỗi `min_interval`
+    giây, nên lượt rerun không phải chờ ghi đĩa. Bảng đơn hàng & bảng giá được dựng lại từ các dòng này.
+    """
+
+    def __init__(self, directory: str, min_interval: float):
+        self.directory = directory
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending_snapshot = None
+        self._pending_stock = None
+        self._last_stock_fetched_at = None
+        self._last_rows_write = 0.0
+        os.makedirs(directory, exist_ok=True)
+        _ignore_in_git(directory)
+        threading.Thread(target=self._run, name="snapshot-persister", daemon=True).start()
+
+    def save_snapshot(self, snapshot):
+        with self._lock:
+            self._pending_snapshot = snapshot
+        self._wakeup.set()
+
+    def save_stock(self, stock_map: dict, fetched_at: float):
+        with self._lock:
+            if fetched_at == self._last_stock_fetched_at:
+                return
+            self._last_stock_fetched_at = fetched_at
+            self._pending_stock = (dict(stock_map), fetched_at)
+        self._wakeup.set()
+
+    def load_snapshot(self):
+        """(các dòng sheet, thời điểm đọc từ Sheets) của lần lưu gần nhất, None nếu chưa có/không đọc được."""
+        try:
+            table, meta = _read_table(os.path.join(self.directory, ORDERS_FILE))
+        except (OSError, pa.ArrowException, ValueError) as e:
+            print(f"Bỏ qua snapshot trên đĩa: {e}")
+            return None
+        if table is None:
+            return None
+        return table_to_rows(table), meta.get("fetched_at", 0.0)
+
+    def load_stock(self):
+        try:
+            table, meta = _read_table(os.path.join(self.directory, STOCK_FILE))
+        except (OSError, pa.ArrowException, ValueError) as e:
+            print(f"Bỏ qua số tồn kho trên đĩa: {e}")
+            return None
+        if table is None:
+            return None
+        return dict(zip(table.column("name").to_pylist(), table.column("qty").to_pylist())), meta.get("fetched_at", 0.0)
+
+    def _run(self):
+        timer_armed = False
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            with self._lock:
+                stock, self._pending_stock = self._pending_stock, None
+                has_snapshot = self._pending_snapshot is not None
+            try:
+                if stock is not None:
+                    self._write_stock(*stock)
+                if not has_snapshot:
+                    continue
+                wait = self._last_rows_write + self.min_interval - time.time()
+                if wait > 0:
+                    # Chưa tới lượt ghi sheet đơn hàng: hẹn lại 1 lần, bản mới hơn tới trong lúc chờ sẽ thay bản cũ
+                    if not timer_armed:
+                        timer_armed = True
+                        threading.Timer(wait, self._wakeup.set).start()
+                    continue
+                timer_armed = False
+                with self._lock:
+                    snapshot, self._pending_snapshot = self._pending_snapshot, None
+                self._write_rows(snapshot)
+            except (OSError, pa.ArrowException) as e:
+                print(f"Không lưu được snapshot xuống đĩa: {e}")
+
+    def _write_stock(self, stock_map: dict, fetched_at: float):
+        table = pa.table({
+            "name": pa.array(list(stock_map), pa.string()),
+            "qty": pa.array(list(stock_map.values()), pa.int64()),
+        })
+        _write_table(os.path.join(self.directory, STOCK_FILE), table, {"fetched_at": fetched_at})
+
+    def _write_rows(self, snapshot):
+        self._last_rows_write = time.time()
+        _write_table(os.path.join(self.directory, ORDERS_FILE), rows_to_table(snapshot.rows), {"fetched_at": snapshot.fetched_at})
+
+
+@st.cache_resource
+def get_snapshot_persister() -> SnapshotPersister:
+    return SnapshotPersister(SNAPSHOT_CACHE_DIR, min_interval=SNAPSHOT_PERSIST_INTERVAL_SECONDS)
@@ -0,0 +1,133 @@
+# stock_ledger.py
+import threading
+import time
+
+import streamlit as st
+
+from config import STOCK_BUNDLES, STOCK_RESERVATION_TTL_SECONDS
+from snapshot_cache import get_snapshot_persister
+from util import normalize_key
+
+
+def to_stock_units(items: dict) -> dict:
+    """Quy đổi {SKU: số lượng đặt} thành {dòng tồn kho: số đơn vị}, gồm cả combo NẾP CHÁY x3/x5."""
+    units = {}
+    for sku, qty in items.items():
+        if not qty:
+            continue
+        stock_name, per_item = STOCK_BUNDLES.get(sku, (sku, 1))
+        key = normalize_key(stock_name)
+        units[key] = units.get(key, 0) + int(qty) * per_item
+    return units
+
+
+class StockLedger:
+    """Sổ tồn kho trong tiến trình: số liệu từ sheet "Quản lí tồn" trừ đi các đơn đã nhận và hàng đang giữ chỗ.
+
+    - Đơn đã nhận (commit) bị trừ ngay, tới khi sheet được đọc lại SAU lúc đơn đó đã ghi lên sheet.
+    - Phiên đang mở hộp thoại xác nhận giữ chỗ số hàng của mình (hết hạn sau reservation_ttl giây).
+    Nhờ vậy hai TNV không thể cùng bán món cuối cùng dù cột công thức Q chưa kịp tính lại.
+    """
+
+    def __init__(self, reservation_ttl: float):
+        self.reservation_ttl = reservation_ttl
+        self._lock = threading.Lock()
+        self._sheet_stock = {}
+        self._seeded_at = None
+        # Số tồn đang dùng là bản lưu trên đĩa từ lần chạy trước, chưa đọc lại từ sheet
+        self.from_disk = False
+        self._committed = {}     # stt -> [units, thời điểm đã ghi lên sheet hoặc None]
+        self._reservations = {}  # session_id -> (units, hết hạn lúc)
+
+    def seed(self, stock_map: dict, fetched_at: float):
+        """Nạp số tồn từ sheet; bỏ các đơn mà lần đọc này đã phản ánh (ghi lên sheet trước lúc đọc)."""
+        with self._lock:
+            if fetched_at == self._seeded_at:
+                return
+            self._sheet_stock = dict(stock_map)
+            self._seeded_at = fetched_at
+            self.from_disk = False
+            self._committed = {
+                stt: entry for stt, entry in self._committed.items()
+                if entry[1] is None or entry[1] > fetched_at
+            }
+
+    def seed_from_disk(self, stock_map: dict, fetched_at: float):
+        with self._lock:
+            if self._seeded_at is None:
+                self._sheet_stock = dict(stock_map)
+                self._seeded_at = fetched_at
+                self.from_disk = True
+
+    @property
+    def age(self):
+        """Tuổi (giây) số tồn đọc từ sheet, None khi chưa nạp lần nào."""
+        seeded_at = self._seeded_at
+        return time.time() - seeded_at if seeded_at is not None else None
+
+    def _held(self, key: str, exclude_session=None) -> int:
+        now = time.time()
+        held = sum(units.get(key, 0) for units, _ in self._committed.values())
+        held += sum(
+            units.get(key, 0) for sid, (units, expires_at) in self._reservations.items()
+            if sid != exclude_session and expires_at > now
+        )
+        return held
+
+    def available(self, stock_name: str, exclude_session=None) -> int:
+        key = normalize_key(stock_name)
+        with self._lock:
+            return max(0, self._sheet_stock.get(key, 0) - self._held(key, exclude_session))
+
+    def reserve(self, session_id: str, items: dict) -> dict:
+        """Giữ chỗ hàng cho phiên (thay cho lần giữ chỗ trước). Trả về {dòng tồn kho: số còn lại} nếu không đủ hàng."""
+        units = to_stock_units(items)
+        with self._lock:
+            self._reservations.pop(session_id, None)
+            shortage = {}
+            for key, qty in units.items():
+                remaining = self._sheet_stock.get(key, 0) - self._held(key)
+                if qty > remaining:
+                    shortage[key] = max(0, remaining)
+            if not shortage:
+                self._reservations[session_id] = (units, time.time() + self.reservation_ttl)
+            return shortage
+
+    def release(self, session_id: str):
+        with self._lock:
+            self._reservations.pop(session_id, None)
+
+    def commit(self, session_id: str, stt: int, items: dict):
+        """Chuyển phần giữ chỗ của phiên thành đơn đã nhận (bị trừ tới khi sheet phản ánh đơn này)."""
+        with self._lock:
+            reserved = self._reservations.pop(session_id, None)
+            units = reserved[0] if reserved else to_stock_units(items)
+            self._committed[stt] = [units, None]
+
+    def commit_many(self, session_id: str, orders: dict):
+        """Như commit() cho cả lô {stt: {SKU: số lượng}} (nhập hàng loạt), bỏ phần giữ chỗ chung của lô."""
+        with self._lock:
+            self._reservations.pop(session_id, None)
+            for stt, items in orders.items():
+                self._committed[stt] = [to_stock_units(items), None]
+
+    def mark_flushed(self, stts: list, flushed_at: float):
+        with self._lock:
+            for stt in stts:
+                if stt in self._committed:
+                    self._committed[stt][1] = flushed_at
+
+    def discard(self, stts: list):
+        """Bỏ các đơn không bao giờ lên sheet (bị chuyển sang bảng đơn lỗi): trả lại số hàng đã trừ."""
+        with self._lock:
+            for stt in stts:
+                self._committed.pop(stt, None)
+
+
+@st.cache_resource
+def get_stock_ledger() -> StockLedger:
+    ledger = StockLedger(reservation_ttl=STOCK_RESERVATION_TTL_SECONDS)
+    persisted = get_snapshot_persister().load_stock()
+    if persisted is not None:
+        ledger.seed_from_disk(*persisted)
+    return ledger
@@ -0,0 +1,39 @@
+# tests/test_image_pipeline.py
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from image_pipeline import load_image_manifest
+
+
+def _save(path, color, size=(40, 20)):
+    Image.new("RGB", size, color).save(path)
+
+
+def test_manifest_follows_source_changes(tmp_path):
+    src_dir, out_dir = tmp_path / "image", tmp_path / "optimized"
+    src_dir.mkdir()
+    _save(src_dir / "a.jpg", "red")
+    key_a = str(src_dir / "a.jpg").replace(os.sep, "/")
+
+    first = load_image_manifest(source_dirs=(str(src_dir),), output_dir=str(out_dir))
+    assert list(first) == [key_a]
+    assert load_image_manifest(source_dirs=(str(src_dir),), output_dir=str(out_dir)) == first
+
+    # Thay ảnh nguồn: biến thể mới theo hash nội dung, biến thể cũ bị xóa
+    _save(src_dir / "a.jpg", "blue", size=(60, 20))
+    os.utime(src_dir / "a.jpg", (1, 1))
+    replaced = load_image_manifest(source_dirs=(str(src_dir),), output_dir=str(out_dir))
+    assert replaced[key_a]["file"] != first[key_a]["file"]
+    assert sorted(p.name for p in out_dir.glob("*.webp")) == [replaced[key_a]["file"]]
+
+    # Thêm ảnh mới: có ngay trong manifest, không cần xóa thư mục đầu ra
+    _save(src_dir / "b.png", "green")
+    added = load_image_manifest(source_dirs=(str(src_dir),), output_dir=str(out_dir))
+    assert str(src_dir / "b.png").replace(os.sep, "/") in added
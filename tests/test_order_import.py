@@ -0,0 +1,36 @@
+# tests/test_order_import.py
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pandas as pd
+import pytest
+
+from order_import import _parse_quantity, validate_import
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("", 0),
+    ("2", 2),
+    ("2.0", 2),
+    ("2,0", 2),
+    (" 3 ", 3),
+    ("-1", None),
+    ("1.5", None),
+    ("nan", None),
+    ("inf", None),
+    ("-inf", None),
+    ("1e999", None),
+    ("abc", None),
+])
+def test_parse_quantity(value, expected):
+    assert _parse_quantity(value) == expected
+
+
+def test_validate_import_reports_infinite_quantity_as_row_error():
+    df = pd.DataFrame([{"Tên TNV bán": "An", "Tên khách": "Bình", "MÍT 500G": "inf"}])
+    orders, file_errors = validate_import(df, {})
+    assert file_errors == []
+    assert orders[0].errors == ["số lượng MÍT 500G không hợp lệ ('inf')"]
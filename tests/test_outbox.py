@@ -0,0 +1,77 @@
+# tests/test_outbox.py
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import gspread
+import pytest
+
+from outbox import OrderOutbox
+
+
+class _Response:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+        self.text = ""
+
+    def json(self):
+        return {"error": {"code": self.status_code, "message": "lỗi giả lập", "status": ""}}
+
+
+class RejectingSheet:
+    """Worksheet giả: batch_update lỗi khi lô có ô `bad_range` (lỗi APIError mã `status` hoặc lỗi mạng)."""
+
+    def __init__(self, bad_range: str, status: int = 400):
+        self.bad_range = bad_range
+        self.status = status
+        self.written = []
+
+    def batch_update(self, data, **kwargs):
+        if any(item["range"] == self.bad_range for item in data):
+            if self.status is None:
+                raise ConnectionError("mất mạng")
+            raise gspread.exceptions.APIError(_Response(self.status))
+        self.written += [item["range"] for item in data]
+
+
+def _outbox(tmp_path, sheet, dead=None) -> OrderOutbox:
+    outbox = OrderOutbox(sheet, str(tmp_path / "outbox.sqlite3"), batch_size=10, flush_delay=0, max_backoff=1,
+                         max_attempts=3, on_dead_letter=dead.extend if dead is not None else None)
+    outbox.enqueue_many([(stt, stt, [{"range": f"A{stt}", "values": [[stt]]}]) for stt in range(1, 11)])
+    return outbox
+
+
+def _attempts(outbox) -> dict:
+    return dict(outbox._conn.execute("SELECT stt, attempts FROM pending_orders"))
+
+
+def test_rejected_order_does_not_block_the_rest(tmp_path):
+    sheet, dead = RejectingSheet("A7"), []
+    outbox = _outbox(tmp_path, sheet, dead)
+
+    with pytest.raises(gspread.exceptions.APIError):
+        outbox.flush_once()
+    assert len(sheet.written) == 9 and "A7" not in sheet.written
+    assert _attempts(outbox) == {7: 1}
+    assert outbox.last_error
+
+    with pytest.raises(gspread.exceptions.APIError):
+        outbox.flush_once()
+    assert outbox.flush_once() == 1
+    assert dead == [7]
+    assert outbox.depth() == 0 and outbox.dead_letter_count() == 1
+    assert outbox.flush_once() == 0
+
+
+@pytest.mark.parametrize("status", [429, 503, None])
+def test_transient_errors_keep_whole_batch_queued(tmp_path, status):
+    sheet = RejectingSheet("A7", status)
+    outbox = _outbox(tmp_path, sheet)
+    for _ in range(5):
+        with pytest.raises(Exception):
+            outbox.flush_once()
+    assert sheet.written == []
+    assert outbox.depth() == 10 and outbox.dead_letter_count() == 0
+    assert set(_attempts(outbox).values()) == {5}
@@ -0,0 +1,118 @@
+# tests/test_reconcile.py
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pandas as pd
+import pytest
+
+from config import COT_STT, COT_TEN_TNV, TONG_TIEN_CAN_TRA, DA_THANH_TOAN
+from order_table import OrderTable
+from reconcile import (
+    BankTransaction, PaymentIndex, parse_amount, parse_memo, name_matches, read_bank_statement,
+    MATCHED, MATCHED_BY_NAME, NAME_MISMATCH, AMOUNT_MISMATCH, ALREADY_PAID, DUPLICATE, UNMATCHED,
+)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("150000", 150000),
+    ("150,000", 150000),
+    ("150.000", 150000),
+    ("1.250.000", 1250000),
+    ("150,000.00", 150000),
+    ("150.000,50", 150000),
+    ("+150,000.00 VND", 150000),
+    ("-150,000", -150000),
+    (" - 150.000 VND", -150000),
+    ("150.000-", -150000),
+    ("(150.000)", -150000),
+    ("2024-01-05", 20240105),
+    ("FT24-150000", 24150000),
+    ("", 0),
+    ("abc", 0),
+])
+def test_parse_amount(value, expected):
+    assert parse_amount(value) == expected
+
+
+@pytest.mark.parametrize("memo, expected", [
+    ("BANHANGF18 DON12 NGUYEN VAN AN", (12, "NGUYENVANAN")),
+    ("BANHANGF18DON12NGUYENVANAN", (12, "NGUYENVANAN")),
+    ("banhang f18 don 12 nguyễn văn an", (12, "NGUYENVANAN")),
+    ("BANHANGF18 D0N7 TRAN THI", (7, "TRANTHI")),
+    ("BANHANGF18 NGUYEN VAN AN", (None, "NGUYENVANAN")),
+    ("chuyen tien", (None, "")),
+    # Ưu tiên cụm DON{số} sau tiền tố, bỏ qua mã giao dịch ngân hàng phía trước
+    ("MBVCB DON5 BANHANGF18 DON12 AN", (12, "AN")),
+])
+def test_parse_memo(memo, expected):
+    assert parse_memo(memo) == expected
+
+
+def test_parse_memo_keeps_truncated_name_prefix():
+    stt, name_key = parse_memo("MBVCB.123456.BANHANGF18 DON7 NGUYEN VA")
+    assert stt == 7
+    assert name_matches(name_key, "NGUYENVANAN")
+    assert not name_matches(name_key, "TRANTHIBINH")
+
+
+def _order_table() -> OrderTable:
+    df = pd.DataFrame({
+        COT_STT: pd.array([1, 2, 3, 4, 5], dtype="Int64"),
+        COT_TEN_TNV: ["Nguyễn Văn An", "Trần Thị Bình", "Lê Hoàng Cường", "Phạm Minh Dũng", "Võ Thị Hạnh"],
+        TONG_TIEN_CAN_TRA: [150000, 200000, 90000, 120000, 60000],
+        DA_THANH_TOAN: [False, True, False, False, False],
+    })
+    return OrderTable(1, df, [])
+
+
+def _tx(line: int, memo: str, amount: int) -> BankTransaction:
+    stt, name_key = parse_memo(memo)
+    return BankTransaction(line=line, memo=memo, amount=amount, stt=stt, name_key=name_key)
+
+
+def test_reconcile_statuses():
+    transactions = [
+        _tx(2, "BANHANGF18 DON1 NGUYEN VAN AN", 150000),
+        _tx(3, "BANHANGF18 DON1 NGUYEN VAN AN", 150000),
+        _tx(4, "BANHANGF18 DON2 TRAN THI BINH", 200000),
+        _tx(5, "BANHANGF18 DON3 LE HOANG CUONG", 80000),
+        _tx(6, "BANHANGF18 DON99 PHAM MINH DUNG", 120000),
+        _tx(7, "BANHANGF18 DON5 TRAN THI BINH", 60000),
+        _tx(8, "chuyen tien", 5000),
+    ]
+    results = PaymentIndex(_order_table()).reconcile(transactions)
+    assert [(r.status, r.stt) for r in results] == [
+        (MATCHED, 1),
+        (DUPLICATE, 1),
+        (ALREADY_PAID, 2),
+        (AMOUNT_MISMATCH, 3),
+        (MATCHED_BY_NAME, 4),
+        (NAME_MISMATCH, 5),
+        (UNMATCHED, None),
+    ]
+    assert [r.confirmed for r in results] == [True, False, False, False, False, False, False]
+    assert results[4].expected == 120000 and results[4].volunteer == "Phạm Minh Dũng"
+
+
+def test_match_by_name_requires_a_unique_candidate():
+    df = _order_table().df
+    df.loc[len(df)] = [6, "Phạm Minh Dũng", 120000, False]
+    table = OrderTable(2, df.astype({COT_STT: "Int64"}), [])
+    # 2 đơn chưa thanh toán cùng TNV, cùng số tiền: không đoán, để người đối soát quyết định
+    [result] = PaymentIndex(table).reconcile([_tx(2, "BANHANGF18 PHAM MINH DUNG", 120000)])
+    assert result.status == UNMATCHED
+
+
+def test_read_bank_statement_skips_debits_and_zero_amounts():
+    csv = (
+        "Ngày,Mô tả,Số tiền\n"
+        "05/01/2024,BANHANGF18 DON1 NGUYEN VAN AN,\"150,000\"\n"
+        "05/01/2024,Rut tien ATM,-500000\n"
+        "05/01/2024,Phi dich vu,0\n"
+        "05/01/2024,,90000\n"
+    ).encode("utf-8")
+    [tx] = read_bank_statement("sao_ke.csv", csv)
+    assert (tx.line, tx.stt, tx.name_key, tx.amount) == (2, 1, "NGUYENVANAN", 150000)
@@ -0,0 +1,40 @@
+# tests/test_sheet_store.py
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from config import GIA_ROW_NAME
+from fake_sheets import FakeSpreadsheet, SHEET_WIDTH
+from order_writer import OrderAllocator, build_order_row, build_row_updates
+from sheet_store import SnapshotStore
+
+
+def _sheet_with_checkbox_tail(n_orders: int, blank_rows: int):
+    """Sheet như thật: sau các đơn là nhiều dòng chỉ có checkbox FALSE (chưa có Tên TNV bán)."""
+    sheet = FakeSpreadsheet(n_orders).sheet1
+    for _ in range(blank_rows):
+        row = [""] * SHEET_WIDTH
+        row[11] = row[12] = row[13] = "FALSE"
+        sheet.grid.append(row)
+    return sheet
+
+
+def test_delta_sees_order_written_between_checkbox_rows():
+    sheet = _sheet_with_checkbox_tail(100, 200)
+    store = SnapshotStore(ttl=60, verify_rows=5, full_sync_interval=600)
+    snapshot = store.get(sheet, wait_for_sheet=True)
+    assert len(snapshot.rows) == GIA_ROW_NAME + 1 + 300
+
+    stt, row_index = OrderAllocator().allocate(snapshot)
+    assert row_index == GIA_ROW_NAME + 1 + 100 + 1
+    row = build_order_row(["TNV thử", "Khách thử", "1 MÍT 500G"], {})
+    row[0] = stt
+    sheet.batch_update(build_row_updates(row_index, row))
+
+    store.invalidate()
+    refreshed = store.get(sheet, wait_for_sheet=True)
+    assert refreshed.changed_from > 0  # vẫn là lần đọc delta, không phải tải toàn bộ
+    assert refreshed.rows[row_index - 1][:2] == (str(stt), "TNV thử")
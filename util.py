@@ -2,8 +2,26 @@
 import time
 import random
 import re
+import unicodedata
+from functools import lru_cache
 import pandas as pd
 import streamlit as st
+from config import TEXT_CACHE_SIZE
+from perf import timed
+from metrics import SHEET_READ_SECONDS
+
+# Bảng bỏ dấu tiếng Việt dựng 1 lần: mỗi ký tự có dấu -> chữ Latinh gốc
+_VIETNAMESE_DEACCENT = str.maketrans({
+    char: base
+    for chars, base in (
+        ("àáảãạăằắẳẵặâầấẩẫậ", "a"), ("èéẻẽẹêềếểễệ", "e"), ("ìíỉĩị", "i"),
+        ("òóỏõọôồốổỗộơờớởỡợ", "o"), ("ùúủũụưừứửữự", "u"), ("ỳýỷỹỵ", "y"), ("đ", "d"),
+        ("ÀÁẢÃẠĂẰẮẲẴẶÂẦẤẨẪẬ", "A"), ("ÈÉẺẼẸÊỀẾỂỄỆ", "E"), ("ÌÍỈĨỊ", "I"),
+        ("ÒÓỎÕỌÔỒỐỔỖỘƠỜỚỞỠỢ", "O"), ("ÙÚỦŨỤƯỪỨỬỮỰ", "U"), ("ỲÝỶỸỴ", "Y"), ("Đ", "D"),
+    )
+    for char in chars
+})
+_NON_ALNUM = re.compile(r"[^a-zA-Z0-9]")
 
 def get_secret(key_name: str) -> str:
     try:
@@ -12,23 +30,66 @@ def get_secret(key_name: str) -> str:
         import os
         return os.environ.get(key_name, "")
 
-def get_sheet_values(sheet_instance):
-    """Đọc dữ liệu bảng tính với cơ chế bảo vệ hàng đợi 3 lần khi dính hạn ngạch mạng."""
-    for attempt in range(3):
+def is_quota_error(error: Exception) -> bool:
+    return "429" in str(error)
+
+def is_retryable_error(error: Exception) -> bool:
+    """Lỗi tạm thời nên thử lại: hết hạn ngạch (429), lỗi phía Google (5xx) hoặc lỗi mạng/timeout.
+    Các lỗi 4xx khác (vùng ghi sai, dữ liệu sai...) thử lại bao nhiêu lần cũng vẫn lỗi."""
+    if is_quota_error(error):
+        return True
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int) and status >= 500:
+        return True
+    # Lỗi kết nối của requests (ConnectionError, Timeout...) đều kế thừa OSError
+    return isinstance(error, OSError)
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """Thời gian chờ lũy thừa có jitter ngẫu nhiên, tránh các phiên cùng thử lại một lúc."""
+    return min(cap, base * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+def _read_with_quota_retry(read_fn, max_attempts: int = 4):
+    """Chạy một lệnh đọc Google Sheets, tự thử lại với backoff lũy thừa khi dính hạn ngạch (429)."""
+    for attempt in range(max_attempts):
         try:
-            return sheet_instance.get_all_values()
+            return read_fn()
         except Exception as e:
-            if "429" in str(e):
-                time.sleep(5 + random.random())
-            else:
+            if not is_quota_error(e):
                 raise e
+            if attempt < max_attempts - 1:
+                time.sleep(backoff_delay(attempt))
     raise Exception("❌ Lỗi Google Sheets: Quá tải hàng đợi yêu cầu (429 Too Many Requests). Vui lòng tải lại trang.")
 
+@timed("sheets.get_all_values")
+def get_sheet_values(sheet_instance):
+    """Đọc toàn bộ dữ liệu bảng tính."""
+    with SHEET_READ_SECONDS.time(kind="full"):
+        return _read_with_quota_retry(sheet_instance.get_all_values)
+
+@timed("sheets.get_range")
+def get_sheet_range(sheet_instance, range_name: str):
+    """Đọc một vùng A1 (VD: 'A120:AS') của bảng tính, dùng cho đồng bộ phần đuôi sheet."""
+    with SHEET_READ_SECONDS.time(kind="range"):
+        return _read_with_quota_retry(lambda: sheet_instance.get(range_name))
+
+@timed("sheets.batch_get_stock")
 def get_stock_data(worksheet_instance, name_range: str, value_range: str):
-    headers = worksheet_instance.get(name_range)
-    values = worksheet_instance.get(value_range)
+    """Đọc cột tên và cột tồn kho trong cùng 1 lệnh batch_get (1 lượt gọi mạng thay vì 2)."""
+    headers, values = _read_with_quota_retry(lambda: worksheet_instance.batch_get([name_range, value_range]))
     return headers, values
 
+def format_age(seconds) -> str:
+    """Tuổi dữ liệu cho người dùng: 'vừa xong', '25 giây trước', '3 phút trước'."""
+    if seconds is None:
+        return "chưa tải"
+    if seconds < 5:
+        return "vừa xong"
+    if seconds < 60:
+        return f"{int(seconds)} giây trước"
+    if seconds < 3600:
+        return f"{int(seconds // 60)} phút trước"
+    return f"{int(seconds // 3600)} giờ trước"
+
 def get_stock(headers_ton, values_ton) -> dict:
     stock_dict = {}
     if not headers_ton or not values_ton:
@@ -70,9 +131,14 @@ def get_gia_hang(sheet_raw_data, row_value: int, row_name: int, row_start: int,
     return price_dict
 
 def normalize_key(text: str) -> str:
+    """Khóa so khớp tên mặt hàng/tồn kho: chuẩn Unicode NFC, viết hoa, gộp khoảng trắng (nhớ kết quả theo chuỗi vào)."""
     if not text:
         return ""
-    return " ".join(str(text).upper().strip().split())
+    return _normalize_key(str(text))
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def _normalize_key(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", text).upper().split())
 
 def clean_money_column(series: pd.Series) -> pd.Series:
     """Làm sạch định dạng dấu chấm ngăn cách tiền tệ VNĐ để tính toán biểu đồ toán học."""
@@ -83,17 +149,10 @@ def convert_name(vietnamese_str: str) -> str:
     """Hàm convert ký tự Latinh loại bỏ dấu tiếng Việt phục vụ sinh text nội dung VietQR chuẩn mã hóa."""
     if not vietnamese_str:
         return "UNKNOWN"
-    
-    patterns = {
-        '[àáảãạăằắẳẵặâầấẩẫậ]': 'a', '[èéẻẽẹêềếểễệ]': 'e', '[ìíỉĩị]': 'i',
-        '[òóỏõọôồốổỗộơờớởỡợ]': 'o', '[ùúủũụưừứửữự]': 'u', '[ỳýỷỹỵ]': 'y', '[đ]': 'd',
-        '[ÀÁẢÃẠĂẰẮẲẴẶÂẦẤẨẪẬ]': 'A', '[ÈÉẺẼẸÊỀẾỂễỆ]': 'E', '[ÌÍỈĨỊ]': 'I',
-        '[ÒÓỎÕỌÔỒỐỔỖỘƠỜỚỞỠỢ]': 'O', '[ÙÚỦŨỤƯỪỨỬỮỰ]': 'U', '[ỲÝỶỸỴ]': 'Y', '[Đ]': 'D'
-    }
-    
-    output = str(vietnamese_str)
-    for regex, replacement in patterns.items():
-        output = re.sub(regex, replacement, output)
-        
-    output = re.sub(r'[^a-zA-Z0-9\s]', '', output)
-    return "".join(output.upper().strip().split())
\ No newline at end of file
+    return _convert_name(str(vietnamese_str))
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def _convert_name(text: str) -> str:
+    # 1 lượt chuẩn hóa NFC (chữ tổ hợp từ Excel/ngân hàng) + 1 lượt bảng dịch thay cho 14 lượt re.sub
+    text = unicodedata.normalize("NFC", text).translate(_VIETNAMESE_DEACCENT)
+    return _NON_ALNUM.sub("", text).upper()
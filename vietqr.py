@@ -0,0 +1,51 @@
+# vietqr.py
+from functools import lru_cache
+
+import segno
+
+from config import STK, BIN_BANK
+
+# Mã định danh NAPAS & dịch vụ chuyển nhanh đến tài khoản theo chuẩn VietQR (EMVCo)
+NAPAS_GUID = "A000000727"
+SERVICE_TO_ACCOUNT = "QRIBFTTA"
+CURRENCY_VND = "704"
+COUNTRY_VN = "VN"
+
+
+def _tlv(tag: str, value: str) -> str:
+    return f"{tag}{len(value):02d}{value}"
+
+
+def crc16_ccitt(data: str) -> str:
+    """CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF) theo yêu cầu trường 63 của EMVCo."""
+    crc = 0xFFFF
+    for byte in data.encode("utf-8"):
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+            crc &= 0xFFFF
+    return f"{crc:04X}"
+
+
+def build_vietqr_payload(bank_bin: str, account_no: str, amount: int, memo: str) -> str:
+    """Sinh chuỗi dữ liệu VietQR động (có số tiền & nội dung) mà mọi app ngân hàng đều quét được."""
+    beneficiary = _tlv("00", bank_bin) + _tlv("01", account_no)
+    merchant_account = _tlv("00", NAPAS_GUID) + _tlv("01", beneficiary) + _tlv("02", SERVICE_TO_ACCOUNT)
+    payload = (
+        _tlv("00", "01")
+        + _tlv("01", "12")
+        + _tlv("38", merchant_account)
+        + _tlv("53", CURRENCY_VND)
+        + (_tlv("54", str(int(amount))) if amount else "")
+        + _tlv("58", COUNTRY_VN)
+        + (_tlv("62", _tlv("08", memo)) if memo else "")
+        + "6304"
+    )
+    return payload + crc16_ccitt(payload)
+
+
+@lru_cache(maxsize=512)
+def vietqr_data_uri(amount: int, memo: str) -> str:
+    """Ảnh QR (SVG data URI) sinh ngay trong tiến trình, lưu đệm LRU theo (số tiền, nội dung)."""
+    payload = build_vietqr_payload(BIN_BANK, STK, amount, memo)
+    return segno.make(payload, error="m", micro=False).svg_data_uri(scale=8, border=2)
@@ -1,16 +1,35 @@
 import streamlit as st
 import os
 import base64
-from config import TIEU_DE_HTML, GIOI_THIEU_HTML, SLIDER_HTML_TEMPLATE, SOCIAL_HTML
+from config import TIEU_DE_HTML, GIOI_THIEU_HTML, SLIDER_HTML_TEMPLATE, SOCIAL_HTML, IMAGE_STATIC_URL
+from image_pipeline import load_image_manifest
 
+@st.cache_resource(show_spinner=False)
 def img_to_base64(path):
+    # Phương án dự phòng khi không build được ảnh tối ưu: mã hóa 1 lần cho cả tiến trình
     if not os.path.exists(path): 
         return ""
     with open(path, "rb") as f:
         ext = os.path.splitext(path)[1].lower().replace('.','')
         return f"data:image/{ext};base64,{base64.b64encode(f.read()).decode()}"
 
+@st.cache_resource(show_spinner=False)
+def get_image_manifest():
+    try:
+        return load_image_manifest()
+    except (ImportError, OSError) as e:
+        print(e)
+        return {}
+
+def image_src(path, manifest):
+    variant = manifest.get(path)
+    if variant:
+        return f"{IMAGE_STATIC_URL}/{variant['file']}"
+    return img_to_base64(path)
+
 def show_about_us():
+    manifest = get_image_manifest()
+
     st.markdown(TIEU_DE_HTML, unsafe_allow_html=True)
     st.markdown("<div class='section-title'>📝 Ô Liu là...</div>", unsafe_allow_html=True)
     st.markdown(GIOI_THIEU_HTML, unsafe_allow_html=True)
@@ -19,22 +38,23 @@ def show_about_us():
     c = st.columns(3)
     with c[0]:
         st.markdown("#### 🎮 Tổ chức ngày hội trò chơi")
-        st.image("image/hoichobe.jpg", use_container_width=True)
+        st.image(manifest.get("image/hoichobe.jpg", {}).get("path", "image/hoichobe.jpg"), use_container_width=True)
     with c[1]:
         st.markdown("#### 🎁 Trao quà & học bổng")
-        st.image("image/hocbong.jpg", use_container_width=True)
+        st.image(manifest.get("image/hocbong.jpg", {}).get("path", "image/hocbong.jpg"), use_container_width=True)
     with c[2]:
         st.markdown("#### 💝 Thăm hỏi hộ khó khăn")
-        st.image("image/thamhoi.jpg", use_container_width=True)
+        st.image(manifest.get("image/thamhoi.jpg", {}).get("path", "image/thamhoi.jpg"), use_container_width=True)
 
     st.markdown("<div class='section-title'>📸 Khoảnh khắc ý nghĩa cùng Ô Liu</div>", unsafe_allow_html=True)
     static_dir = "static"
     if os.path.exists(static_dir):
-        images_found = [os.path.join(static_dir, f) for f in os.listdir(static_dir) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
+        images_found = [f"{static_dir}/{f}" for f in os.listdir(static_dir) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
         images_found.sort()
         if images_found:
-            html_imgs = "".join([f'<img src="{img_to_base64(p)}">' for p in images_found])
+            # Ảnh đã tối ưu được trình duyệt tải trực tiếp qua static file serving (lazy), không nhồi base64 qua websocket
+            html_imgs = "".join([f'<img src="{image_src(p, manifest)}" loading="lazy" decoding="async">' for p in images_found])
             st.markdown(SLIDER_HTML_TEMPLATE.format(images_html=html_imgs), unsafe_allow_html=True)
 
     st.markdown("<div class='section-title'>📬 Kết nối cùng chúng mình</div>", unsafe_allow_html=True)
-    st.markdown(SOCIAL_HTML, unsafe_allow_html=True)
\ No newline at end of file
+    st.markdown(SOCIAL_HTML, unsafe_allow_html=True)
@@ -1,10 +1,8 @@
-import gspread
 import streamlit as st
 import pandas as pd
-import requests
 import math
 from config import (
-    thoi_gian_nhan_hang, STK, TEN_CHU_TK, BIN_BANK, product_column_map, GIA_ROW_NAME,
+    thoi_gian_nhan_hang, STK, TEN_CHU_TK, COT_TEN_TNV, TONG_TIEN_CAN_TRA,
     MIT_500G, THAP_CAM_500G, CHUOI_SAY_ME_DUONG_500G, CHUOI_SAY_MOC_500G,
     KHOAI_TAY_RONG_BIEN_250G, KHOAI_TAY_MAM_250G, KHOAI_MON_TRUNG_CUA_250G,
     NEP_CHAY_CHA_BONG_150G_X3, NEP_CHAY_CHA_BONG_150G_X5, COM_CHAY_CHA_BONG_200G,
@@ -12,14 +10,22 @@ from config import (
     MAM_1_LIT, DIEU_RANG_MUOI_200G, DIEU_RANG_MUOI_500G, DIEU_MAM_OT_500G,
     VI_NGAN, VI_DAI, BOP_VIET, TUI_XACH_NHO, TUI_XACH_LON, TUI_DUNG_COM, TUI_DUNG_DT
 )
-from util import normalize_key, convert_name, get_sheet_values
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from util import convert_name, get_secret, format_age
+from sheet_store import get_snapshot_store
+from order_table import load_order_table
+from order_writer import get_order_allocator, build_row_updates, build_order_row
+from outbox import get_order_outbox
+from vietqr import vietqr_data_uri
+from perf import timed, traced
+from metrics import ORDER_SUBMIT_SECONDS, ORDERS_SUBMITTED
 
+SHARE_URL = get_secret("SHARE_URL")
+
+@timed("render.vietqr")
 def generate_vietqr_html(amount, code_label):
-    res = requests.post("https://api.vietqr.io/v2/generate", json={
-        "accountNo": STK, "accountName": TEN_CHU_TK, "acqId": BIN_BANK,
-        "amount": amount, "addInfo": code_label, "template": "compact2"
-    })
-    qr_url = res.json().get('data', {}).get('qrDataURL', '')
+    # Sinh mã VietQR ngay trên server (không gọi api.vietqr.io), kết quả được lưu đệm theo (số tiền, nội dung)
+    qr_url = vietqr_data_uri(int(amount), code_label)
     return f"""
     <div style='text-align:center;'>
         <img src="{qr_url}" style="max-width:50%; height:auto; border-radius:10px; box-shadow: 0 4px 10px rgba(0,0,0,0.15);" />
@@ -27,151 +33,153 @@ def generate_vietqr_html(amount, code_label):
     </div>
     """
 
-def show_order_entry(sheet, stock_data):
+def show_order_entry(sheet, stock_ledger):
     st.title("📦 Nhập đơn hàng")
     
     col1, col2 = st.columns(2)
     with col1: st.markdown("Vui lòng điền các thông tin bên dưới. Sau đó ấn 'Xác nhận & Gửi đơn'")
     with col2: st.markdown('<div style="font-size:14px; text-align:right;">📍 Điểm lấy hàng: Chung Cư Bình Minh, Quận 2 — <a href="https://maps.app.goo.gl/ggeuzpja9fodBJNz9" target="_blank">Google Map</a></div>', unsafe_allow_html=True)
 
-    def check_stock(prod): 
-        return max(0, stock_data.get(normalize_key(prod), 0))
-
     if "don_hang_moi" not in st.session_state:
         st.session_state["don_hang_moi"] = None
+    session_id = get_script_run_ctx().session_id
 
-    with st.form("form_nhap_don"):
-        with st.expander("ℹ️ Thông tin khách hàng", expanded=True):
-            c1, c2 = st.columns(2)
-            ten_tnv = c1.text_input("👤 Tên TNV bán *")
-            sdt = c1.text_input("📞 SĐT khách")
-            quan_tinh = c1.text_input("🗺️ Quận/Tỉnh")
-            ten_khach = c2.text_input("👥 Tên khách *")
-            dia_chi = c2.text_input("🏠 Địa chỉ (nếu ship)")
-            thoi_gian_nhan = c2.selectbox("🕓 Thời gian nhận hàng", thoi_gian_nhan_hang)
-            chi_tiet_don = st.text_area("📋 Chi tiết đơn hàng*")
-
-        with st.expander("🍯 Mật ong, Mắm, Điều", expanded=False):
-            c1, c2 = st.columns(2)
-            mo_500 = c1.number_input("🍯 Mật ong 500ml", min_value=0, max_value=check_stock("MẬT ONG 500ML"), step=1)
-            d_200 = c1.number_input("🥜 Điều muối 200g", min_value=0, max_value=check_stock("ĐIỀU RANG MUỐI 200G"), step=1)
-            d_mam = c1.number_input("🌶️ Điều mắm ớt 500g", min_value=0, max_value=check_stock("ĐIỀU MẮM ỚT 500G"), step=1)
-            mo_1l = c2.number_input("🍯 Mật ong 1 lít", min_value=0, max_value=check_stock("MẬT ONG 1 LÍT"), step=1)
-            d_500 = c2.number_input("🥜 Điều muối 500g", min_value=0, max_value=check_stock("ĐIỀU RANG MUỐI 500G"), step=1)
-            mam = c2.number_input("🥫 Mắm 1 lít", min_value=0, max_value=check_stock("MẮM 1 LÍT"), step=1)
-
-        with st.expander("🍱 Rau củ quả - trái cây sấy", expanded=False):
-            c1, c2 = st.columns(2)
-            mit = c1.number_input("🥭 Mít sấy 500g", min_value=0, max_value=check_stock("MÍT 500G"), step=1)
-            tc = c1.number_input("🍱 Thập cẩm 500g", min_value=0, max_value=check_stock("THẬP CẨM 500G"), step=1)
-            c_me = c1.number_input("🍌 Chuối sấy mè đường 500g", min_value=0, max_value=check_stock("CHUỐI SẤY MÈ ĐƯỜNG 500G"), step=1)
-            c_moc = c1.number_input("🍌 Chuối sấy mộc 500g", min_value=0, max_value=check_stock("CHUỐI SẤY MỘC 500G"), step=1)
-            kt_rb = c2.number_input("🥔 Khoai tây rong biển 250g", min_value=0, max_value=check_stock("KHOAI TÂY RONG BIỂN 250G"), step=1)
-            kt_mam = c2.number_input("🥔 Khoai tây mắm 250g", min_value=0, max_value=check_stock("KHOAI TÂY MẮM 250G"), step=1)
-            km_trung = c2.number_input("🍠 Khoai môn trứng cua 250g", min_value=0, max_value=check_stock("KHOAI MÔN TRỨNG CUA 250G"), step=1)
-
-        with st.expander("🍚 Cơm cháy, Bánh tráng mắm", expanded=False):
-            c1, c2 = st.columns(2)
-            nc_3 = c1.number_input("🍙 Nếp cháy chà bông x3", min_value=0, max_value=math.floor(check_stock("NẾP CHÁY CHÀ BÔNG 150G")/3), step=1)
-            cc_200 = c1.number_input("🍚 Cơm cháy chà bông 200g", min_value=0, max_value=check_stock("CƠM CHÁY CHÀ BÔNG 200G"), step=1)
-            bt_mam = c1.number_input("🥖 Bánh tráng mắm", min_value=0, max_value=check_stock("BÁNH TRÁNG MẮM"), step=1)
-            nc_5 = c2.number_input("🍙 Nếp cháy chà bông x5", min_value=0, max_value=math.floor(check_stock("NẾP CHÁY CHÀ BÔNG 150G")/5), step=1)
-            gl_rb = c2.number_input("🌾 Gạo lứt rong biển 200g", min_value=0, max_value=check_stock("GẠO LỨT RONG BIỂN 200G"), step=1)
-
-        with st.expander("👜 Túi xách & Ví vải", expanded=False):
-            c1, c2 = st.columns(2)
-            v_ngan = c1.number_input("👛 Ví ngắn", min_value=0, max_value=check_stock("VÍ NGẮN"), step=1)
-            v_dai = c2.number_input("👝 Ví dài", min_value=0, max_value=check_stock("VÍ DÀI"), step=1)
-            b_viet = c1.number_input("✏️ Bóp viết", min_value=0, max_value=check_stock("BÓP VIẾT"), step=1)
-            tx_nho = c2.number_input("👜 Túi xách nhỏ", min_value=0, max_value=check_stock("TÚI XÁCH NHỎ"), step=1)
-            tx_lon = c1.number_input("🧳 Túi xách lớn", min_value=0, max_value=check_stock("TÚI XÁCH LỚN"), step=1)
-            td_com = c2.number_input("🍱 Túi đựng cơm", min_value=0, max_value=check_stock("TÚI ĐỰNG CƠM"), step=1)
-            td_dt = c1.number_input("📱 Túi đựng điện thoại", min_value=0, max_value=check_stock("TÚI ĐỰNG ĐIỆN THOẠI"), step=1)
-
-        submitted = st.form_submit_button("🚀 Xác nhận & Gửi đơn", type="primary")
-
-    @st.dialog(title="🧾 Xác nhận đơn hàng", width="large")
-    def review_dialog(summary_info, items_purchased, complete_row):
-        st.subheader("📌 Thông tin khách hàng")
-        st.table(pd.DataFrame(list(summary_info.items()), columns=["Mục", "Dữ liệu"]))
-        st.subheader("🛒 Giỏ hàng")
-        if items_purchased:
-            st.table(pd.DataFrame(list(items_purchased.items()), columns=["Mặt hàng", "Số lượng"]))
-        else:
-            st.error("Giỏ hàng của bạn đang trống!")
+    # Fragment riêng: bấm gửi / đóng mở hộp thoại chỉ chạy lại khối nhập đơn, không chạy lại banner & các view khác
+    @st.fragment
+    @traced("fragment.nhap_don")
+    def khoi_nhap_don():
+        def check_stock(prod): 
+            # Tra sổ tồn kho trong bộ nhớ: đã trừ đơn vừa nhận & hàng phiên khác đang giữ chỗ
+            return stock_ledger.available(prod, exclude_session=session_id)
 
-        if st.button("📩 Gửi đơn", disabled=not items_purchased):
-            with st.spinner("⏳ Đang ghi dữ liệu..."):
-                # 1. Tìm dòng trống đầu tiên dựa vào cột B (Tên TNV bán)
-                all_tnv_values = sheet.col_values(2)  
-                next_row_index = len(all_tnv_values) + 1
-                
-                # 2. Tính toán số STT tiếp theo
-                all_stt = sheet.col_values(1)[4:]  
-                valid_stt = [int(x) for x in all_stt if str(x).isdigit()]
-                next_stt = max(valid_stt) + 1 if valid_stt else 1
-                
-                # Gán STT vào vị trí đầu tiên
-                complete_row[0] = next_stt
-                
-                # 3. Chuẩn bị danh sách các ô cần cập nhật (Bỏ qua ô trống hoặc ô công thức)
-                # Kỹ thuật batch_update giúp đẩy nhiều ô lên cùng 1 lúc mà không làm mất công thức các ô còn lại
-                update_data = []
+        st.caption(f"📦 Số tồn kho cập nhật {format_age(stock_ledger.age)}")
+        with st.form("form_nhap_don"):
+            with st.expander("ℹ️ Thông tin khách hàng", expanded=True):
+                c1, c2 = st.columns(2)
+                ten_tnv = c1.text_input("👤 Tên TNV bán *")
+                sdt = c1.text_input("📞 SĐT khách")
+                quan_tinh = c1.text_input("🗺️ Quận/Tỉnh")
+                ten_khach = c2.text_input("👥 Tên khách *")
+                dia_chi = c2.text_input("🏠 Địa chỉ (nếu ship)")
+                thoi_gian_nhan = c2.selectbox("🕓 Thời gian nhận hàng", thoi_gian_nhan_hang)
+                chi_tiet_don = st.text_area("📋 Chi tiết đơn hàng*")
+
+            with st.expander("🍯 Mật ong, Mắm, Điều", expanded=False):
+                c1, c2 = st.columns(2)
+                mo_500 = c1.number_input("🍯 Mật ong 500ml", min_value=0, max_value=check_stock("MẬT ONG 500ML"), step=1)
+                d_200 = c1.number_input("🥜 Điều muối 200g", min_value=0, max_value=check_stock("ĐIỀU RANG MUỐI 200G"), step=1)
+                d_mam = c1.number_input("🌶️ Điều mắm ớt 500g", min_value=0, max_value=check_stock("ĐIỀU MẮM ỚT 500G"), step=1)
+                mo_1l = c2.number_input("🍯 Mật ong 1 lít", min_value=0, max_value=check_stock("MẬT ONG 1 LÍT"), step=1)
+                d_500 = c2.number_input("🥜 Điều muối 500g", min_value=0, max_value=check_stock("ĐIỀU RANG MUỐI 500G"), step=1)
+                mam = c2.number_input("🥫 Mắm 1 lít", min_value=0, max_value=check_stock("MẮM 1 LÍT"), step=1)
+
+            with st.expander("🍱 Rau củ quả - trái cây sấy", expanded=False):
+                c1, c2 = st.columns(2)
+                mit = c1.number_input("🥭 Mít sấy 500g", min_value=0, max_value=check_stock("MÍT 500G"), step=1)
+                tc = c1.number_input("🍱 Thập cẩm 500g", min_value=0, max_value=check_stock("THẬP CẨM 500G"), step=1)
+                c_me = c1.number_input("🍌 Chuối sấy mè đường 500g", min_value=0, max_value=check_stock("CHUỐI SẤY MÈ ĐƯỜNG 500G"), step=1)
+                c_moc = c1.number_input("🍌 Chuối sấy mộc 500g", min_value=0, max_value=check_stock("CHUỐI SẤY MỘC 500G"), step=1)
+                kt_rb = c2.number_input("🥔 Khoai tây rong biển 250g", min_value=0, max_value=check_stock("KHOAI TÂY RONG BIỂN 250G"), step=1)
+                kt_mam = c2.number_input("🥔 Khoai tây mắm 250g", min_value=0, max_value=check_stock("KHOAI TÂY MẮM 250G"), step=1)
+                km_trung = c2.number_input("🍠 Khoai môn trứng cua 250g", min_value=0, max_value=check_stock("KHOAI MÔN TRỨNG CUA 250G"), step=1)
+
+            with st.expander("🍚 Cơm cháy, Bánh tráng mắm", expanded=False):
+                c1, c2 = st.columns(2)
+                nc_3 = c1.number_input("🍙 Nếp cháy chà bông x3", min_value=0, max_value=math.floor(check_stock("NẾP CHÁY CHÀ BÔNG 150G")/3), step=1)
+                cc_200 = c1.number_input("🍚 Cơm cháy chà bông 200g", min_value=0, max_value=check_stock("CƠM CHÁY CHÀ BÔNG 200G"), step=1)
+                bt_mam = c1.number_input("🥖 Bánh tráng mắm", min_value=0, max_value=check_stock("BÁNH TRÁNG MẮM"), step=1)
+                nc_5 = c2.number_input("🍙 Nếp cháy chà bông x5", min_value=0, max_value=math.floor(check_stock("NẾP CHÁY CHÀ BÔNG 150G")/5), step=1)
+                gl_rb = c2.number_input("🌾 Gạo lứt rong biển 200g", min_value=0, max_value=check_stock("GẠO LỨT RONG BIỂN 200G"), step=1)
+
+            with st.expander("👜 Túi xách & Ví vải", expanded=False):
+                c1, c2 = st.columns(2)
+                v_ngan = c1.number_input("👛 Ví ngắn", min_value=0, max_value=check_stock("VÍ NGẮN"), step=1)
+                v_dai = c2.number_input("👝 Ví dài", min_value=0, max_value=check_stock("VÍ DÀI"), step=1)
+                b_viet = c1.number_input("✏️ Bóp viết", min_value=0, max_value=check_stock("BÓP VIẾT"), step=1)
+                tx_nho = c2.number_input("👜 Túi xách nhỏ", min_value=0, max_value=check_stock("TÚI XÁCH NHỎ"), step=1)
+                tx_lon = c1.number_input("🧳 Túi xách lớn", min_value=0, max_value=check_stock("TÚI XÁCH LỚN"), step=1)
+                td_com = c2.number_input("🍱 Túi đựng cơm", min_value=0, max_value=check_stock("TÚI ĐỰNG CƠM"), step=1)
+                td_dt = c1.number_input("📱 Túi đựng điện thoại", min_value=0, max_value=check_stock("TÚI ĐỰNG ĐIỆN THOẠI"), step=1)
+
+            submitted = st.form_submit_button("🚀 Xác nhận & Gửi đơn", type="primary")
+
+        @st.dialog(title="🧾 Xác nhận đơn hàng", width="large")
+        @traced("dialog.xac_nhan_don")
+        def review_dialog(summary_info, items_purchased, complete_row):
+            st.subheader("📌 Thông tin khách hàng")
+            st.table(pd.DataFrame(list(summary_info.items()), columns=["Mục", "Dữ liệu"]))
+            st.subheader("🛒 Giỏ hàng")
+            if items_purchased:
+                st.table(pd.DataFrame(list(items_purchased.items()), columns=["Mặt hàng", "Số lượng"]))
+            else:
+                st.error("Giỏ hàng của bạn đang trống!")
+
+            if st.button("📩 Gửi đơn", disabled=not items_purchased):
+                with st.spinner("⏳ Đang ghi dữ liệu..."), ORDER_SUBMIT_SECONDS.time(source="form"):
+                    # 1. Cấp phát STT & dòng ghi ngay trong tiến trình (có khóa), không cần đọc lại cột A/B
+                    next_stt, next_row_index = get_order_allocator().allocate(get_snapshot_store().get(sheet, wait_for_sheet=True))
                 
-                for col_idx, value in enumerate(complete_row, start=1):
-                    # Chỉ cập nhật ô nếu giá trị không rỗng và không phải bằng 0 (đối với số lượng hàng)
-                    if value != "" and value != 0:
-                        # Chuyển đổi chỉ số cột số thành ký tự cột chữ (Ví dụ: 1 -> A, 2 -> B...)
-                        col_letter = gspread.utils.rowcol_to_a1(1, col_idx).replace("1", "")
-                        
-                        update_data.append({
-                            'range': f"{col_letter}{next_row_index}",
-                            'values': [[value]]
-                        })
+                    # Gán STT vào vị trí đầu tiên
+                    complete_row[0] = next_stt
                 
-                # 4. Gửi lệnh cập nhật hàng loạt lên Google Sheets
-                if update_data:
-                    sheet.batch_update(update_data, value_input_option="USER_ENTERED")
+                    # 2. Lưu đơn vào hàng đợi cục bộ; luồng nền gộp & đẩy lên Google Sheets trong 1 lệnh batch_update
+                    # (bỏ qua ô trống để không làm mất công thức các ô còn lại, tự thử lại khi dính 429)
+                    get_order_outbox(sheet, SHARE_URL).enqueue(next_stt, next_row_index, build_row_updates(next_row_index, complete_row))
+                    stock_ledger.commit(session_id, next_stt, items_purchased)
+                    ORDERS_SUBMITTED.inc()
                 
-                st.toast(f"✅ Đơn hàng số {next_stt} đã được ghi thành công!")
-                st.session_state["don_hang_moi"] = next_stt
-                st.session_state.sheet_data = get_sheet_values(sheet)
-                st.rerun()
-
-    if submitted:
-        if not ten_tnv.strip() or not ten_khach.strip() or not chi_tiet_don.strip():
-            st.warning("⚠️ Hãy nhập đầy đủ các thông tin bắt buộc có dấu (*)")
+                    st.toast(f"✅ Đơn hàng số {next_stt} đã được tiếp nhận!")
+                    st.session_state["don_hang_moi"] = next_stt
+                    st.rerun()
+
+        if not submitted:
+            # Hộp thoại xác nhận chỉ tồn tại trong lượt chạy bấm gửi: lượt chạy khác nghĩa là đã đóng, trả lại hàng giữ chỗ
+            stock_ledger.release(session_id)
         else:
-            summary = {"Tên TNV bán": ten_tnv, "Tên khách": ten_khach, "SĐT khách": sdt, "Địa chỉ": dia_chi, "Quận/Tỉnh": quan_tinh, "Thời gian nhận hàng": str(thoi_gian_nhan), "Chi tiết đơn": chi_tiet_don}
-            mapping_items = {
-                MIT_500G: mit, THAP_CAM_500G: tc, CHUOI_SAY_ME_DUONG_500G: c_me, CHUOI_SAY_MOC_500G: c_moc,
-                KHOAI_TAY_RONG_BIEN_250G: kt_rb, KHOAI_TAY_MAM_250G: kt_mam, KHOAI_MON_TRUNG_CUA_250G: km_trung,
-                NEP_CHAY_CHA_BONG_150G_X3: nc_3, NEP_CHAY_CHA_BONG_150G_X5: nc_5, COM_CHAY_CHA_BONG_200G: cc_200,
-                GAO_LUT_RONG_BIEN_200G: gl_rb, BANH_TRANG_MAM: bt_mam, MAT_ONG_500ML: mo_500, MAT_ONG_1_LIT: mo_1l,
-                MAM_1_LIT: mam, DIEU_RANG_MUOI_200G: d_200, DIEU_RANG_MUOI_500G: d_500, DIEU_MAM_OT_500G: d_mam,
-                VI_NGAN: v_ngan, VI_DAI: v_dai, BOP_VIET: b_viet, TUI_XACH_NHO: tx_nho,
-                TUI_XACH_LON: tx_lon, TUI_DUNG_COM: td_com, TUI_DUNG_DT: td_dt
-            }
-            purchased = {k: v for k, v in mapping_items.items() if v > 0}
+            if not ten_tnv.strip() or not ten_khach.strip() or not chi_tiet_don.strip():
+                st.warning("⚠️ Hãy nhập đầy đủ các thông tin bắt buộc có dấu (*)")
+            else:
+                summary = {"Tên TNV bán": ten_tnv, "Tên khách": ten_khach, "SĐT khách": sdt, "Địa chỉ": dia_chi, "Quận/Tỉnh": quan_tinh, "Thời gian nhận hàng": str(thoi_gian_nhan), "Chi tiết đơn": chi_tiet_don}
+                mapping_items = {
+                    MIT_500G: mit, THAP_CAM_500G: tc, CHUOI_SAY_ME_DUONG_500G: c_me, CHUOI_SAY_MOC_500G: c_moc,
+                    KHOAI_TAY_RONG_BIEN_250G: kt_rb, KHOAI_TAY_MAM_250G: kt_mam, KHOAI_MON_TRUNG_CUA_250G: km_trung,
+                    NEP_CHAY_CHA_BONG_150G_X3: nc_3, NEP_CHAY_CHA_BONG_150G_X5: nc_5, COM_CHAY_CHA_BONG_200G: cc_200,
+                    GAO_LUT_RONG_BIEN_200G: gl_rb, BANH_TRANG_MAM: bt_mam, MAT_ONG_500ML: mo_500, MAT_ONG_1_LIT: mo_1l,
+                    MAM_1_LIT: mam, DIEU_RANG_MUOI_200G: d_200, DIEU_RANG_MUOI_500G: d_500, DIEU_MAM_OT_500G: d_mam,
+                    VI_NGAN: v_ngan, VI_DAI: v_dai, BOP_VIET: b_viet, TUI_XACH_NHO: tx_nho,
+                    TUI_XACH_LON: tx_lon, TUI_DUNG_COM: td_com, TUI_DUNG_DT: td_dt
+                }
+                purchased = {k: v for k, v in mapping_items.items() if v > 0}
             
-            raw_row = [""] * 45
-            raw_row[1], raw_row[2], raw_row[3], raw_row[4], raw_row[5], raw_row[6], raw_row[7] = ten_tnv, ten_khach, chi_tiet_don, sdt, dia_chi, quan_tinh, str(thoi_gian_nhan)
-            for k, v in purchased.items():
-                raw_row[product_column_map[k] - 1] = v
+                raw_row = build_order_row([ten_tnv, ten_khach, chi_tiet_don, sdt, dia_chi, quan_tinh, str(thoi_gian_nhan)], purchased)
                 
-            review_dialog(summary, purchased, raw_row)
-
-    if st.session_state["don_hang_moi"]:
-        last_id = st.session_state["don_hang_moi"]
-        if st.button("💳 Bấm vào đây để tạo mã QR thanh toán", type="primary"):
-            df_sync = pd.DataFrame(st.session_state.sheet_data[GIA_ROW_NAME+1:], columns=st.session_state.sheet_data[GIA_ROW_NAME])
-            df_sync.columns = df_sync.columns.str.replace('\n', '', regex=True)
-            matched_row = df_sync[df_sync["STT"] == str(last_id)].iloc[0].to_dict()
+                # Giữ chỗ hàng trong lúc hộp thoại xác nhận đang mở để phiên khác không bán trùng
+                thieu_hang = stock_ledger.reserve(session_id, purchased)
+                if thieu_hang:
+                    st.error("⚠️ Không đủ hàng tồn: " + ", ".join(f"{k} (còn {v})" for k, v in thieu_hang.items()))
+                else:
+                    review_dialog(summary, purchased, raw_row)
+
+    @st.fragment
+    @traced("fragment.thanh_toan_qr")
+    def khoi_thanh_toan_qr():
+        if st.session_state["don_hang_moi"]:
+            last_id = st.session_state["don_hang_moi"]
+            if st.button("💳 Bấm vào đây để tạo mã QR thanh toán", type="primary"):
+                # Đọc snapshot mới nhất: đơn có thể vừa được luồng outbox đẩy lên sheet sau lượt chạy toàn trang
+                matched_row = load_order_table(get_snapshot_store().get(sheet)).find(last_id)
+                if matched_row is None:
+                    # Đơn vẫn nằm trong hàng đợi, sheet chưa kịp tính tổng tiền
+                    st.info(f"⏳ Đơn hàng số {last_id} đang được đồng bộ lên Google Sheets, vui lòng bấm lại sau ít giây.")
+                    return
             
-            amount = int(matched_row['TỔNG TIỀNCẦN TRẢ(1)+(2)'].replace('.', ''))
-            content_qr = f"BANHANGF18 DON{last_id} {convert_name(matched_row['TÊN TNV BÁN'])}"
+                amount = int(matched_row[TONG_TIEN_CAN_TRA])
+                content_qr = f"BANHANGF18 DON{last_id} {convert_name(matched_row[COT_TEN_TNV])}"
             
-            with st.expander("📢 Vui lòng kiểm tra kĩ thông tin chuyển khoản trước khi chuyển tiền", expanded=True):
-                st.write(f"**Số tài khoản:** `{STK}` | **Tên người nhận:** `{TEN_CHU_TK}` | **Số tiền:** `{amount:,.0f} VND` | **Nội dung:** `{content_qr}` ")
-                st.markdown(generate_vietqr_html(amount, content_qr), unsafe_allow_html=True)
-            st.session_state["don_hang_moi"] = None
\ No newline at end of file
+                with st.expander("📢 Vui lòng kiểm tra kĩ thông tin chuyển khoản trước khi chuyển tiền", expanded=True):
+                    st.write(f"**Số tài khoản:** `{STK}` | **Tên người nhận:** `{TEN_CHU_TK}` | **Số tiền:** `{amount:,.0f} VND` | **Nội dung:** `{content_qr}` ")
+                    st.markdown(generate_vietqr_html(amount, content_qr), unsafe_allow_html=True)
+                st.session_state["don_hang_moi"] = None
+
+    khoi_nhap_don()
+    khoi_thanh_toan_qr()
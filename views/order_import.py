@@ -0,0 +1,127 @@
+import streamlit as st
+import pandas as pd
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from config import IMPORT_MAX_ORDERS
+from util import get_secret, format_age
+from sheet_store import get_snapshot_store
+from order_import import build_import_template, read_import_file, validate_import
+from order_writer import get_order_allocator, build_row_updates
+from order_table import format_vnd
+from outbox import get_order_outbox
+from perf import span, traced
+from metrics import ORDER_SUBMIT_SECONDS, ORDERS_SUBMITTED
+
+SHARE_URL = get_secret("SHARE_URL")
+
+def show_order_import(sheet, stock_ledger, gia_mat_hang):
+    st.title("📤 Nhập đơn hàng loạt")
+    st.markdown(
+        "Dành cho trưởng nhóm gom đơn ngoài app: tải file mẫu, điền mỗi dòng 1 đơn "
+        f"(cột mặt hàng ghi số lượng), rồi tải lên file CSV/Excel. Tối đa {IMPORT_MAX_ORDERS} đơn mỗi lần."
+    )
+    st.download_button("⬇️ Tải file mẫu (CSV)", build_import_template(), file_name="mau_nhap_don.csv", mime="text/csv")
+
+    # Giữ chỗ hàng của lô nhập riêng với giữ chỗ của form nhập đơn trong cùng phiên
+    reservation_id = f"{get_script_run_ctx().session_id}:import"
+    if "nhap_loat_ket_qua" not in st.session_state:
+        st.session_state["nhap_loat_ket_qua"] = None
+    if "nhap_loat_file_key" not in st.session_state:
+        st.session_state["nhap_loat_file_key"] = 0
+
+    # Fragment riêng: tải file / bấm nhập chỉ chạy lại khối này
+    @st.fragment
+    @traced("fragment.nhap_hang_loat")
+    def khoi_nhap_hang_loat():
+        if st.session_state["nhap_loat_ket_qua"]:
+            st.success(st.session_state["nhap_loat_ket_qua"])
+
+        uploaded = st.file_uploader(
+            "📎 File đơn hàng (.csv, .xlsx)", type=["csv", "xlsx"],
+            key=f"nhap_loat_file_{st.session_state['nhap_loat_file_key']}",
+        )
+        if uploaded is None:
+            stock_ledger.release(reservation_id)
+            return
+
+        try:
+            with span("import.read_file"):
+                df_file = read_import_file(uploaded.name, uploaded.getvalue())
+        except ImportError:
+            st.error("⚠️ Máy chủ chưa cài openpyxl nên chưa đọc được file Excel, vui lòng lưu file dạng CSV.")
+            return
+        except Exception as e:
+            st.error(f"⚠️ Không đọc được file: {e}")
+            return
+
+        with span("import.validate"):
+            orders, file_errors = validate_import(df_file, gia_mat_hang)
+        for message in file_errors:
+            st.warning(f"⚠️ {message}")
+        if not orders:
+            st.info("File không có dòng đơn hàng nào.")
+            stock_ledger.release(reservation_id)
+            return
+
+        st.subheader("🧾 Kiểm tra trước khi nhập")
+        df_review = pd.DataFrame([{
+            "Dòng": o.line,
+            "Tên TNV bán": o.info.get("Tên TNV bán", ""),
+            "Tên khách": o.info.get("Tên khách", ""),
+            "Mặt hàng": ", ".join(f"{qty} {sku}" for sku, qty in o.items.items()),
+            "Tiền hàng (VND)": format_vnd(o.total),
+            "Lỗi": "; ".join(o.errors),
+        } for o in orders])
+        st.dataframe(df_review, hide_index=True, use_container_width=True)
+
+        invalid = [o for o in orders if o.errors]
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Số đơn", len(orders))
+        c2.metric("Dòng lỗi", len(invalid))
+        c3.metric("Tổng tiền hàng (VND)", format_vnd(sum(o.total for o in orders)))
+
+        blocked = bool(invalid)
+        if invalid:
+            st.error("⚠️ Hãy sửa các dòng lỗi trong file rồi tải lên lại (lô nhập chỉ ghi khi tất cả các dòng hợp lệ).")
+        if len(orders) > IMPORT_MAX_ORDERS:
+            st.error(f"⚠️ File có {len(orders)} đơn, vượt quá {IMPORT_MAX_ORDERS} đơn mỗi lần nhập. Hãy tách thành nhiều file.")
+            blocked = True
+
+        # Giữ chỗ tổng số hàng của cả lô trong lúc xem lại, để phiên khác không bán mất
+        if not blocked:
+            tong_hang = {}
+            for o in orders:
+                for sku, qty in o.items.items():
+                    tong_hang[sku] = tong_hang.get(sku, 0) + qty
+            thieu_hang = stock_ledger.reserve(reservation_id, tong_hang)
+            if thieu_hang:
+                st.error("⚠️ Không đủ hàng tồn cho cả lô: " + ", ".join(f"{k} (còn {v})" for k, v in thieu_hang.items()))
+                st.caption(f"📦 Số tồn kho cập nhật {format_age(stock_ledger.age)}")
+                blocked = True
+        else:
+            stock_ledger.release(reservation_id)
+
+        if st.button(f"📩 Nhập {len(orders)} đơn", type="primary", disabled=blocked):
+            with st.spinner("⏳ Đang ghi dữ liệu..."), ORDER_SUBMIT_SECONDS.time(source="import"):
+                # Cấp 1 khối STT & dòng liên tiếp cho cả lô, rồi đưa vào outbox cùng lúc:
+                # luồng nền đẩy tất cả lên Google Sheets trong 1 lệnh batch_update
+                first_stt, first_row = get_order_allocator().allocate(
+                    get_snapshot_store().get(sheet, wait_for_sheet=True), count=len(orders))
+                pending, committed = [], {}
+                for offset, order in enumerate(orders):
+                    stt, row_index = first_stt + offset, first_row + offset
+                    complete_row = order.to_row()
+                    complete_row[0] = stt
+                    pending.append((stt, row_index, build_row_updates(row_index, complete_row)))
+                    committed[stt] = order.items
+                get_order_outbox(sheet, SHARE_URL).enqueue_many(pending)
+                stock_ledger.commit_many(reservation_id, committed)
+                ORDERS_SUBMITTED.inc(len(orders))
+
+            last_stt = first_stt + len(orders) - 1
+            st.session_state["nhap_loat_ket_qua"] = f"✅ Đã tiếp nhận {len(orders)} đơn, STT {first_stt} → {last_stt}."
+            # Đổi key để xóa file vừa nhập, tránh bấm nhập trùng lần nữa
+            st.session_state["nhap_loat_file_key"] += 1
+            st.rerun(scope="fragment")
+
+    khoi_nhap_hang_loat()
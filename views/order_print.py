@@ -1,72 +1,139 @@
+import html
 import streamlit as st
 import pandas as pd
 import streamlit.components.v1 as components
-from config import GIA_ROW_NAME, PRINT_MULTI_HTML
+from config import (
+    PRINT_MULTI_HTML, INVOICE_BLOCK_HTML, COT_STT, COT_CHI_TIET_DON, TONG_TIEN_CAN_TRA, TIEN_BAN_HANG,
+    DA_THANH_TOAN, DA_SOAN_DON, DA_GIAO_TNV, PRINT_CHUNK_SIZE
+)
+from order_table import MONEY_COLUMNS
+from order_writer import write_status_flags
+from sheet_store import get_snapshot_store
+from perf import span, timed, traced
 
-def compile_print_jobs(dataframe, stt_list, price_catalog):
-    sub_set = dataframe[pd.to_numeric(dataframe["STT"], errors="coerce").isin(stt_list)]
-    if sub_set.empty:
-        st.warning("Không tìm thấy dữ liệu trùng khớp để in.")
-        return
-    
-    html_accumulation = ""
-    for _, matrix_row in sub_set.iterrows():
-        r_data = {k: v for k, v in matrix_row.to_dict().items() if str(v).strip() not in ["", "None", "nan"]}
-        info_bucket, product_bucket = {}, {}
-        
-        for k, v in r_data.items():
-            if k.strip() in price_catalog and float(v) > 0: 
-                product_bucket[k] = v
-            else: 
-                info_bucket[k] = v
-            
-        df_customer = pd.DataFrame(list(info_bucket.items()), columns=["Mục", "Nội dung"])
-        df_items = pd.DataFrame(list(product_bucket.items()), columns=["Sản phẩm", "Số lượng"])
-        
-        # Áp dụng chính xác logic map tên và format tiền tệ giống hệt tab Tra Cứu của bạn
-        df_customer.loc[df_customer["Mục"] == "CHI TIẾT ĐƠN (VUI LÒNG ĐIỀN CHÍNH XÁC VỚI Ô CỘT SỐ LƯỢNG BÊN PHẢI)", "Mục"] = "CHI TIẾT ĐƠN"
-        df_customer.loc[df_customer["Mục"] == "TỔNG TIỀNCẦN TRẢ(1)+(2)", "Mục"] = "TỔNG TIỀN CẦN TRẢ"
-        df_customer.loc[df_customer["Mục"] == "TIỀN HÀNG BÁN ĐƯỢC", "Mục"] = "TIỀN HÀNG" # Đồng bộ theo TIEN_BAN_HANG
-        
-        # Định dạng tiền tệ có dấu chấm phân cách kiểu Việt Nam
-        for target_col in ["TỔNG TIỀN CẦN TRẢ", "TIỀN HÀNG"]:
-            df_customer.loc[df_customer["Mục"] == target_col, "Nội dung"] = df_customer.loc[
-                df_customer["Mục"] == target_col, "Nội dung"
-            ].map(lambda x: f"{int(str(x).replace('.', '').replace(',', '')):,}".replace(",", "."))
-
-        # Lọc bỏ bớt các trường cồng kềnh khi in hóa đơn giấy bọc hàng
-        df_customer = df_customer[~df_customer["Mục"].isin(["Đã thanh toán", "ĐÃ SOẠN ĐƠN", "ĐÃ GIAO TNV(TNV điền hoặc người giao điền)"])]
-        
-        block_html = f"""
-        <div class="order" style="page-break-after: always; border-bottom: 2px dashed #000; padding-bottom: 15px; margin-bottom: 25px;">
-            <h3 style="text-align:center; font-family: sans-serif;">📄 Đơn hàng STT: {r_data.get("STT")}</h3>
-            {df_customer.to_html(index=False, border=1)}
-            <br>
-            {df_items.to_html(index=False, border=1)}
-        </div>
-        """
-        html_accumulation += block_html
+# Đổi tên hiển thị các tiêu đề cột dài dòng & ẩn các cột nội bộ kho khi in hóa đơn giấy bọc hàng
+INVOICE_LABELS = {COT_CHI_TIET_DON: "CHI TIẾT ĐƠN", TONG_TIEN_CAN_TRA: "TỔNG TIỀN CẦN TRẢ", TIEN_BAN_HANG: "TIỀN HÀNG"}
+INVOICE_HIDDEN_COLUMNS = {DA_THANH_TOAN, DA_SOAN_DON, DA_GIAO_TNV}
+
+def _escape_series(series: pd.Series) -> pd.Series:
+    return (series.str.replace("&", "&amp;", regex=False).str.replace("<", "&lt;", regex=False)
+            .str.replace(">", "&gt;", regex=False).str.replace('"', "&quot;", regex=False))
+
+def _html_rows(label: str, values: pd.Series, keep: pd.Series) -> pd.Series:
+    """Sinh dòng <tr> cho cả lô đơn cùng lúc; đơn nào không có giá trị thì chuỗi rỗng."""
+    cell = f"<tr><td>{html.escape(label)}</td><td>" + values + "</td></tr>"
+    return cell.where(keep, "")
+
+@timed("render.print_jobs_html")
+def render_print_jobs_html(order_table, stt_list, price_catalog) -> str:
+    """Dựng HTML hóa đơn cho nhiều đơn theo lô: tách cột 1 lần, định dạng tiền dạng vector, nối chuỗi bằng join."""
+    positions = sorted({order_table.stt_index[int(stt)] for stt in stt_list if int(stt) in order_table.stt_index})
+    if not positions:
+        return ""
+    sub_set = order_table.df.iloc[positions]
+
+    info_rows = pd.Series("", index=sub_set.index)
+    for col in order_table.info_columns:
+        if col in INVOICE_HIDDEN_COLUMNS:
+            continue
+        if col in MONEY_COLUMNS:
+            # 1200000 -> 1.200.000 cho cả cột
+            values = sub_set[col].astype(str).str.replace(r"\B(?=(\d{3})+(?!\d))", ".", regex=True)
+        else:
+            values = _escape_series(sub_set[col].astype("string").fillna("").astype(str))
+        info_rows += _html_rows(INVOICE_LABELS.get(col, col), values, values.str.strip() != "")
 
+    item_rows = pd.Series("", index=sub_set.index)
+    for col in order_table.product_columns:
+        if col.strip() not in price_catalog:
+            continue
+        quantities = sub_set[col]
+        item_rows += _html_rows(col, quantities.astype(str), quantities > 0)
+
+    return "".join(
+        INVOICE_BLOCK_HTML.format(stt=stt, info_rows=info, item_rows=items)
+        for stt, info, items in zip(sub_set[COT_STT].astype(str), info_rows, item_rows)
+    )
+
+def compile_print_jobs(order_table, stt_list, price_catalog) -> bool:
+    html_accumulation = render_print_jobs_html(order_table, stt_list, price_catalog)
+    if not html_accumulation:
+        st.warning("Không tìm thấy dữ liệu trùng khớp để in.")
+        return False
     components.html(PRINT_MULTI_HTML.format(all_orders_html=html_accumulation), height=1)
+    return True
+
+def mark_orders_prepared(sheet, stt_list) -> int:
+    """Tick ĐÃ SOẠN ĐƠN cho các đơn vừa in (1 lệnh batch_update, số đơn chưa soạn cập nhật ngay ở mọi phiên)."""
+    with span("print.mark_prepared"):
+        return write_status_flags(sheet, get_snapshot_store(), stt_list, DA_SOAN_DON)
 
-def show_order_print(gia_mat_hang):
+def show_order_print(sheet, order_table, gia_mat_hang):
     st.title("🖨️ In hóa đơn hàng loạt")
-    df_p = pd.DataFrame(st.session_state.sheet_data[GIA_ROW_NAME+1:], columns=st.session_state.sheet_data[GIA_ROW_NAME])
-    df_p.columns = df_p.columns.str.replace('\n', '', regex=True)
-    df_p = df_p.loc[:, ~df_p.columns.duplicated()]
-
-    all_ids = df_p["STT"].dropna().unique().tolist()
-    unprepared_ids = pd.to_numeric(df_p[df_p["ĐÃ SOẠN ĐƠN"] == "FALSE"]["STT"], errors="coerce").dropna().astype(int).unique().tolist()
-
-    col1, col2 = st.columns(2)
-    with col1:
-        with st.form("unprepared_form"):
-            st.info(f"Tổng số đơn hàng chưa soạn trên hệ thống: **{len(unprepared_ids)}**")
-            if st.form_submit_button("In tất cả đơn chưa soạn", type="primary"):
-                compile_print_jobs(df_p, unprepared_ids, gia_mat_hang)
-
-    with col2:
-        with st.form("selective_form"):
-            picked_stt = st.multiselect("🔢 Chọn thủ công STT các đơn hàng cần in:", options=all_ids)
-            if st.form_submit_button("In đơn hàng"):
-                compile_print_jobs(df_p, [int(x) for x in picked_stt], gia_mat_hang)
\ No newline at end of file
+    df_p = order_table.df
+
+    with span("print.id_lists"):
+        all_ids = df_p[COT_STT].dropna().astype(int).unique().tolist()
+        unprepared_ids = df_p.loc[~df_p[DA_SOAN_DON], COT_STT].dropna().astype(int).unique().tolist()
+        prepared_ids = set(df_p.loc[df_p[DA_SOAN_DON], COT_STT].dropna().astype(int).tolist())
+
+    # Fragment riêng: bấm in chỉ chạy lại khối chọn đơn, không chạy lại toàn bộ ứng dụng
+    @st.fragment
+    @traced("fragment.in_don")
+    def khoi_in_don():
+        if st.session_state.get("in_don_thong_bao"):
+            st.success(st.session_state.pop("in_don_thong_bao"))
+
+        def bat_dau_in(stt_list):
+            st.session_state["in_don_hang_doi"] = {"stts": list(stt_list), "done": 0, "pending": True}
+            st.session_state["in_don_vua_in"] = []
+
+        col1, col2 = st.columns(2)
+        with col1:
+            with st.form("unprepared_form"):
+                st.info(f"Tổng số đơn hàng chưa soạn trên hệ thống: **{len(unprepared_ids)}**")
+                if st.form_submit_button("In tất cả đơn chưa soạn", type="primary"):
+                    bat_dau_in(unprepared_ids)
+
+        with col2:
+            with st.form("selective_form"):
+                picked_stt = st.multiselect("🔢 Chọn thủ công STT các đơn hàng cần in:", options=all_ids)
+                if st.form_submit_button("In đơn hàng"):
+                    bat_dau_in([int(x) for x in picked_stt])
+
+        # Lô lớn được chia thành nhiều lệnh in PRINT_CHUNK_SIZE đơn, lô kế tiếp chỉ được dựng khi người dùng bấm:
+        # bộ nhớ & thời gian mỗi lệnh in không phụ thuộc tổng số đơn trong hàng đợi
+        job = st.session_state.get("in_don_hang_doi")
+        if job and job["pending"]:
+            job["pending"] = False
+            chunk = job["stts"][job["done"]:job["done"] + PRINT_CHUNK_SIZE]
+            job["done"] += len(chunk)
+            if compile_print_jobs(order_table, chunk, gia_mat_hang):
+                st.session_state["in_don_vua_in"] += chunk
+
+        if job and len(job["stts"]) > PRINT_CHUNK_SIZE:
+            done, total = job["done"], len(job["stts"])
+            st.progress(done / total, text=f"Đã gửi lệnh in {done}/{total} đơn "
+                                           f"(lô {-(-done // PRINT_CHUNK_SIZE)}/{-(-total // PRINT_CHUNK_SIZE)}, mỗi lô {PRINT_CHUNK_SIZE} đơn)")
+            if done < total:
+                c1, c2 = st.columns([3, 1])
+                c1.button(f"🖨️ In lô tiếp theo ({min(PRINT_CHUNK_SIZE, total - done)} đơn)", type="primary",
+                          on_click=lambda: job.update(pending=True))
+                c2.button("Dừng in", on_click=lambda: job.update(stts=job["stts"][:job["done"]]))
+
+        # Sau khi in xong: đánh dấu đã soạn để lần in "tất cả đơn chưa soạn" kế tiếp không in lại các đơn này
+        vua_in = [stt for stt in st.session_state.get("in_don_vua_in") or [] if stt not in prepared_ids]
+        if vua_in:
+            if st.button(f"✅ Đánh dấu {len(vua_in)} đơn vừa in là ĐÃ SOẠN ĐƠN"):
+                try:
+                    with st.spinner("⏳ Đang ghi dữ liệu..."):
+                        so_don = mark_orders_prepared(sheet, vua_in)
+                except Exception as e:
+                    st.error(f"⚠️ Chưa ghi được lên Google Sheets, vui lòng bấm lại sau ít giây: {e}")
+                else:
+                    st.session_state["in_don_vua_in"] = []
+                    st.session_state["in_don_thong_bao"] = f"✅ Đã đánh dấu {so_don} đơn là đã soạn."
+                    # Chạy lại toàn trang để số đơn chưa soạn lấy theo snapshot vừa vá
+                    st.rerun()
+
+    khoi_in_don()
@@ -0,0 +1,96 @@
+import hashlib
+
+import streamlit as st
+import pandas as pd
+
+from config import DA_THANH_TOAN, RECONCILE_CACHE_ENTRIES
+from reconcile import PaymentIndex, read_bank_statement, MATCHED, UNMATCHED
+from order_table import format_vnd
+from order_writer import write_status_flags
+from sheet_store import get_snapshot_store
+from perf import span, traced
+from metrics import CACHE_REQUESTS, CACHE_MISSES
+
+# Tick chọn trong bảng kết quả làm fragment chạy lại: chỉ đọc file & khớp đơn lại khi đổi file hoặc snapshot có bản mới
+@st.cache_data(show_spinner=False, max_entries=RECONCILE_CACHE_ENTRIES)
+def doi_soat_sao_ke(file_hash, snapshot_version, file_name, _data, _order_table):
+    CACHE_MISSES.inc(cache="reconcile")
+    with span("reconcile.read_statement"):
+        transactions = read_bank_statement(file_name, _data)
+    with span("reconcile.match"):
+        return PaymentIndex(_order_table).reconcile(transactions)
+
+def show_reconcile(sheet, order_table):
+    st.title("💰 Đối soát chuyển khoản")
+    st.markdown(
+        "Tải lên file sao kê (CSV/Excel) xuất từ ngân hàng. App đọc nội dung chuyển khoản dạng "
+        "`BANHANGF18 DON{STT} {TÊN TNV}` (chấp nhận gõ sai, thiếu dấu cách, tên bị cắt), đối chiếu số tiền với "
+        "tổng tiền cần trả rồi ghi cột **Đã thanh toán** cho các đơn được chọn trong 1 lần."
+    )
+    if "doi_soat_file_key" not in st.session_state:
+        st.session_state["doi_soat_file_key"] = 0
+
+    # Fragment riêng: tải file / tick chọn chỉ chạy lại khối này
+    @st.fragment
+    @traced("fragment.doi_soat")
+    def khoi_doi_soat():
+        if st.session_state.get("doi_soat_thong_bao"):
+            st.success(st.session_state.pop("doi_soat_thong_bao"))
+
+        uploaded = st.file_uploader(
+            "📎 File sao kê (.csv, .xlsx)", type=["csv", "xlsx"],
+            key=f"doi_soat_file_{st.session_state['doi_soat_file_key']}",
+        )
+        if uploaded is None:
+            return
+        data = uploaded.getvalue()
+        CACHE_REQUESTS.inc(cache="reconcile")
+        try:
+            results = doi_soat_sao_ke(hashlib.sha1(data).hexdigest(), order_table.version, uploaded.name, data, order_table)
+        except ImportError:
+            st.error("⚠️ Máy chủ chưa cài openpyxl nên chưa đọc được file Excel, vui lòng lưu file dạng CSV.")
+            return
+        except Exception as e:
+            st.error(f"⚠️ Không đọc được file sao kê: {e}")
+            return
+
+        df_ket_qua = pd.DataFrame([{
+            "Ghi nhận": r.confirmed,
+            "Dòng": r.transaction.line,
+            "Nội dung": r.transaction.memo,
+            "Số tiền (VND)": format_vnd(r.transaction.amount),
+            "STT": r.stt,
+            "TNV": r.volunteer,
+            "Cần trả (VND)": format_vnd(r.expected) if r.expected is not None else "",
+            "Kết quả": r.status,
+        } for r in results])
+        if df_ket_qua.empty:
+            st.info("File sao kê không có giao dịch nào.")
+            return
+
+        counts = df_ket_qua["Kết quả"].value_counts()
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Giao dịch", len(df_ket_qua))
+        c2.metric("Khớp", int(counts.get(MATCHED, 0)))
+        c3.metric("Không tìm thấy đơn", int(counts.get(UNMATCHED, 0)))
+
+        st.caption("Giao dịch khớp chắc chắn đã được tick sẵn; kiểm tra rồi tick thêm các dòng \"cần kiểm tra\" nếu đúng.")
+        df_chon = st.data_editor(
+            df_ket_qua, hide_index=True, use_container_width=True,
+            disabled=[c for c in df_ket_qua.columns if c != "Ghi nhận"],
+            column_config={"STT": st.column_config.NumberColumn(format="%d")},
+        )
+        stt_ghi = sorted({int(stt) for stt, chon in zip(df_chon["STT"], df_chon["Ghi nhận"]) if chon and pd.notna(stt)})
+
+        if st.button(f"💾 Ghi nhận đã thanh toán cho {len(stt_ghi)} đơn", type="primary", disabled=not stt_ghi):
+            try:
+                with st.spinner("⏳ Đang ghi dữ liệu..."), span("reconcile.write_flags"):
+                    so_don = write_status_flags(sheet, get_snapshot_store(), stt_ghi, DA_THANH_TOAN)
+            except Exception as e:
+                st.error(f"⚠️ Chưa ghi được lên Google Sheets, vui lòng bấm lại sau ít giây: {e}")
+            else:
+                st.session_state["doi_soat_thong_bao"] = f"✅ Đã ghi nhận thanh toán cho {so_don} đơn."
+                st.session_state["doi_soat_file_key"] += 1
+                st.rerun()
+
+    khoi_doi_soat()